@@ -0,0 +1,362 @@
+"""
+A cache of decoded images and sounds kept in a single binary file, so
+later launches skip PNG and OGG decoding entirely, an AssetManager
+that only keeps the graphics in use loaded and an AssetLoader that
+fills both in on a worker thread.
+"""
+
+import os
+import json
+import mmap
+import struct
+import threading
+from collections import OrderedDict
+
+import pygame as pg
+
+
+MAGIC = b"JCAC"
+VERSION = 1
+#Magic, version, index offset and index length.
+HEADER = struct.Struct("<4sIQQ")
+#Blobs start on multiples of this many bytes.
+ALIGN = 16
+
+
+def file_stamp(path):
+    """Return a value that changes whenever the file at path does."""
+    info = os.stat(path)
+    return [info.st_mtime, info.st_size]
+
+
+class AssetCache(object):
+    """Decoded pixel data and PCM samples stored in one memory-mapped file.
+
+    Each entry is looked up by key and is only used if the stamp it was
+    stored with matches the one asked for, so entries are rebuilt as soon
+    as their source files change. Entries that are not used during a run
+    are dropped when save rewrites the file. It may be used from more
+    than one thread."""
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.RLock()
+        self.index = {}
+        self.mapped = None
+        self.file = None
+        self.new_blobs = {}
+        self.used = set()
+        self.changed = False
+        try:
+            self.open()
+        except (IOError, OSError, ValueError, struct.error):
+            self.close()
+            self.index = {}
+
+    def open(self):
+        self.file = open(self.path, "rb")
+        self.mapped = mmap.mmap(self.file.fileno(), 0,
+                    access=mmap.ACCESS_READ)
+        magic, version, offset, length = HEADER.unpack_from(self.mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("not an asset cache")
+        self.index = json.loads(self.mapped[offset:offset + length].decode())
+
+    def close(self):
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def lookup(self, key, stamp):
+        """Return the entry for key if it was stored with stamp."""
+        with self.lock:
+            entry = self.index.get(key)
+            if entry is None or entry["stamp"] != stamp:
+                return None
+            if self.mapped is None and key not in self.new_blobs:
+                return None
+            self.used.add(key)
+            return entry
+
+    def blob(self, key, entry):
+        if key in self.new_blobs:
+            return memoryview(self.new_blobs[key])
+        offset = entry["offset"]
+        return memoryview(self.mapped)[offset:offset + entry["length"]]
+
+    def store(self, key, stamp, data, **info):
+        info["stamp"] = stamp
+        info["length"] = len(data)
+        with self.lock:
+            self.index[key] = info
+            self.new_blobs[key] = data
+            self.used.add(key)
+            self.changed = True
+
+    def get_surface(self, key, stamp, rows=None):
+        """Return (surface, meta) for a cached surface, or None. If rows is
+        a (top, height) pair only that band of the surface is built."""
+        with self.lock:
+            entry = self.lookup(key, stamp)
+            if entry is None or entry["kind"] != "image":
+                return None
+            view = self.blob(key, entry)
+            size = entry["size"]
+            if rows is not None:
+                top, height = rows
+                pitch = size[0] * len(entry["mode"])
+                view = view[top * pitch:(top + height) * pitch]
+                size = size[0], height
+            image = pg.image.frombuffer(view, size, entry["mode"])
+            if entry["mode"] == "RGBA":
+                image = image.convert_alpha()
+            else:
+                image = image.convert()
+            del view
+        if entry["colorkey"] is not None:
+            image.set_colorkey(entry["colorkey"])
+        return image, entry["meta"]
+
+    def put_surface(self, key, stamp, surface, meta=None):
+        alpha = surface.get_flags() & pg.SRCALPHA
+        mode = "RGBA" if alpha else "RGB"
+        colorkey = surface.get_colorkey()
+        if colorkey is not None:
+            colorkey = list(colorkey)
+        self.store(key, stamp, pg.image.tostring(surface, mode),
+                    kind="image", size=list(surface.get_size()), mode=mode,
+                    colorkey=colorkey, meta=meta)
+
+    def get_sound(self, key, stamp):
+        with self.lock:
+            entry = self.lookup(key, stamp)
+            if entry is None or entry["kind"] != "sound":
+                return None
+            view = self.blob(key, entry)
+            sound = pg.mixer.Sound(buffer=view)
+            del view
+        return sound
+
+    def put_sound(self, key, stamp, sound):
+        self.store(key, stamp, sound.get_raw(), kind="sound")
+
+    def load_image(self, path, colorkey):
+        """Load the image at path as tools.load_all_gfx would."""
+        stamp = file_stamp(path)
+        cached = self.get_surface(path, stamp)
+        if cached is not None:
+            return cached[0]
+        img = pg.image.load(path)
+        if img.get_alpha():
+            img = img.convert_alpha()
+        else:
+            img = img.convert()
+            img.set_colorkey(colorkey)
+        self.put_surface(path, stamp, img)
+        return img
+
+    def ensure_image(self, path, colorkey):
+        """Make sure the image at path is cached without keeping it loaded,
+        so it can be loaded cheaply later."""
+        if self.lookup(path, file_stamp(path)) is None:
+            self.load_image(path, colorkey)
+
+    def load_sound(self, path):
+        """Load the sound at path, decoded for the current mixer format."""
+        stamp = file_stamp(path) + [list(pg.mixer.get_init())]
+        sound = self.get_sound(path, stamp)
+        if sound is None:
+            sound = pg.mixer.Sound(path)
+            self.put_sound(path, stamp, sound)
+        return sound
+
+    def save(self):
+        """Rewrite the cache file with the entries used this run if any were
+        added or some went unused. Failing to write it is not an error;
+        the assets are simply decoded again next time."""
+        with self.lock:
+            self.write()
+
+    def write(self):
+        if not self.changed and self.used == set(self.index):
+            return
+        index = {}
+        temp_path = self.path + ".tmp"
+        try:
+            cache_dir = os.path.dirname(self.path)
+            if cache_dir and not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            with open(temp_path, "wb") as f:
+                f.write(b"\0" * HEADER.size)
+                for key in sorted(self.used):
+                    entry = dict(self.index[key])
+                    pad = -f.tell() % ALIGN
+                    f.write(b"\0" * pad)
+                    entry["offset"] = f.tell()
+                    view = self.blob(key, self.index[key])
+                    f.write(view)
+                    del view
+                    index[key] = entry
+                data = json.dumps(index).encode()
+                offset = f.tell()
+                f.write(data)
+                f.seek(0)
+                f.write(HEADER.pack(MAGIC, VERSION, offset, len(data)))
+            try:
+                os.rename(temp_path, self.path)
+            except OSError:
+                #Windows will not rename over a file, or remove a mapped one.
+                self.close()
+                os.remove(self.path)
+                os.rename(temp_path, self.path)
+        except (IOError, OSError):
+            return
+        self.close()
+        self.index = index
+        self.new_blobs = {}
+        self.changed = False
+        self.open()
+
+
+def surface_bytes(surface):
+    w, h = surface.get_size()
+    return w * h * surface.get_bytesize()
+
+
+class AssetManager(object):
+    """Loads assets on first use and keeps them until the bytes resident
+    pass budget, when the least recently used ones that are not pinned
+    are dropped. Each asset is registered with a loader that returns
+    (asset, size in bytes) and is reloaded if needed again.
+
+    Anything still holding a reference to a dropped asset keeps it alive,
+    so only assets nothing is drawing are actually freed. Loading holds
+    a lock, so assets may be looked up from any thread."""
+    def __init__(self, budget):
+        self.budget = budget
+        self.lock = threading.RLock()
+        self.groups = {}
+        self.loaders = {}
+        self.resident = OrderedDict()
+        self.pinned = {}
+        self.resident_bytes = 0
+
+    def group(self, name, loaders):
+        """Register loaders, a dict of asset name to loader, and return an
+        AssetGroup that looks them up by name. Calling group again with
+        the same name adds loaders to the existing group."""
+        with self.lock:
+            names = self.groups.setdefault(name, [])
+            for asset_name, loader in loaders.items():
+                if (name, asset_name) not in self.loaders:
+                    names.append(asset_name)
+                self.loaders[(name, asset_name)] = loader
+        return AssetGroup(self, name, names)
+
+    def get(self, key):
+        with self.lock:
+            if key in self.resident:
+                asset, size = self.resident.pop(key)
+            else:
+                asset, size = self.loaders[key]()
+                self.resident_bytes += size
+            self.resident[key] = asset, size
+            self.evict()
+            return asset
+
+    def pin(self, group, names):
+        """Keep the named assets of group loaded until pin is next called
+        for group, loading any that are not already."""
+        with self.lock:
+            self.pinned[group] = set(names)
+            for name in names:
+                self.get((group, name))
+
+    def is_pinned(self, key):
+        return key[1] in self.pinned.get(key[0], ())
+
+    def evict(self):
+        if self.resident_bytes <= self.budget:
+            return
+        for key in list(self.resident):
+            if self.resident_bytes <= self.budget:
+                break
+            if not self.is_pinned(key):
+                asset, size = self.resident.pop(key)
+                self.resident_bytes -= size
+
+
+class AssetGroup(object):
+    """A dict-like view of one group of an AssetManager's assets. names is
+    the manager's list for the group, so assets registered later show
+    up here too."""
+    def __init__(self, manager, name, names):
+        self.manager = manager
+        self.name = name
+        self.names = names
+
+    def __getitem__(self, name):
+        return self.manager.get((self.name, name))
+
+    def __contains__(self, name):
+        return name in self.names
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def keys(self):
+        return list(self.names)
+
+    def pin(self, names):
+        self.manager.pin(self.name, names)
+
+
+class AssetLoader(object):
+    """Runs loading jobs on a daemon thread. stages is a list of
+    (stage name, jobs) where jobs is a list of callables run in order;
+    a stage is ready once its jobs and those of every earlier stage
+    have run. An exception raised by a job stops loading and is raised
+    again by check."""
+    def __init__(self, stages):
+        self.stages = stages
+        self.total = sum(len(jobs) for name, jobs in stages)
+        self.completed = 0
+        self.finished = set()
+        self.error = None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.daemon = True
+
+    def start(self):
+        self.thread.start()
+
+    def run(self):
+        try:
+            for name, jobs in self.stages:
+                for job in jobs:
+                    job()
+                    self.completed += 1
+                self.finished.add(name)
+        except Exception as e:
+            self.error = e
+
+    @property
+    def progress(self):
+        """The fraction of jobs that have run."""
+        if not self.total:
+            return 1.
+        return self.completed / float(self.total)
+
+    def ready(self, stage=None):
+        """Return True if stage has loaded, or everything if stage is None."""
+        if stage is None:
+            return len(self.finished) == len(self.stages)
+        return stage in self.finished
+
+    def check(self):
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,336 @@
+"""Flat array board model used by TileGrid for all game logic.
+
+Each cell holds a small integer combo ID (an index into JEWEL_COMBOS) or
+EMPTY. GridCell and Jewel objects only mirror this for rendering."""
+
+from array import array
+from random import choice, randint
+import threading
+
+from .grid_funcs import find_grid_runs
+
+
+JEWEL_COLORS = ["blue", "pink", "clear"]
+JEWEL_NUMS = [1, 4, 5, 3]
+JEWEL_COMBOS = [(color, num) for color in JEWEL_COLORS
+            for num in JEWEL_NUMS]
+COMBO_IDS = {combo: i for i, combo in enumerate(JEWEL_COMBOS)}
+EMPTY = -1
+MIN_MATCH = 3
+
+
+def combo_id(color, gem_num):
+    """Return the combo ID for a (color, gem_num) pair."""
+    return COMBO_IDS[(color, gem_num)]
+
+
+class Board(object):
+    """A num_columns x num_rows grid of combo IDs stored row by row
+    in a single signed char array."""
+    def __init__(self, num_columns, num_rows):
+        self.num_columns = num_columns
+        self.num_rows = num_rows
+        self.cells = array("b", [EMPTY]) * (num_columns * num_rows)
+        self.dirty = set(range(len(self.cells)))
+
+    def index(self, x, y):
+        return y * self.num_columns + x
+
+    def position(self, index):
+        return index % self.num_columns, index // self.num_columns
+
+    def __getitem__(self, pos):
+        return self.cells[pos[1] * self.num_columns + pos[0]]
+
+    def __setitem__(self, pos, value):
+        self.set(pos[1] * self.num_columns + pos[0], value)
+
+    def set(self, index, value):
+        """Write a combo ID and remember the cell as changed."""
+        self.cells[index] = value
+        self.dirty.add(index)
+
+    def take_dirty(self):
+        """Return the indices changed since the last call."""
+        dirty, self.dirty = self.dirty, set()
+        return dirty
+
+    def is_full(self):
+        return EMPTY not in self.cells
+
+    def occupied(self):
+        """Return a list of ((x, y), combo_id) for every non-empty cell."""
+        w = self.num_columns
+        return [((i % w, i // w), c) for i, c in enumerate(self.cells)
+                    if c != EMPTY]
+
+    def find_matches(self):
+        """Return lists of (x, y) indices for every horizontal run
+        followed by every vertical run of MIN_MATCH or more."""
+        return find_grid_runs(self.cells, self.num_columns, self.num_rows,
+                    MIN_MATCH, EMPTY)
+
+    def load(self, cells):
+        """Replace every cell with the values in cells."""
+        self.cells[:] = cells
+        self.dirty.update(range(len(self.cells)))
+
+    def run_values(self, x, y):
+        """Return the values that would complete a run if placed at
+        (x, y), given the cells on either side in its row and column."""
+        cells = self.cells
+        w, h = self.num_columns, self.num_rows
+        i = y * w + x
+        values = set()
+        for pos, step, size in ((x, 1, w), (y, w, h)):
+            near = [cells[i + step * d] if 0 <= pos + d < size else EMPTY
+                        for d in (-2, -1, 1, 2)]
+            for a, b in ((0, 1), (1, 2), (2, 3)):
+                if near[a] == near[b] != EMPTY:
+                    values.add(near[a])
+        return values
+
+    def generate(self, combos):
+        """Fill the board with a random layout that has no matches and at
+        least one legal move, in a single pass.
+
+        A move is planted first: two cells of one combo beside each
+        other and a third offset diagonally from the end of the pair,
+        e.g. A A . / . . A. Every other cell then picks from the combos
+        that would not complete a run with cells already placed. With at
+        least four combos a choice always remains, so the time taken is
+        bounded by the board size."""
+        w, h = self.num_columns, self.num_rows
+        cells = self.cells
+        for i in range(len(cells)):
+            cells[i] = EMPTY
+        horizontal = w >= 3 and h >= 2
+        vertical = w >= 2 and h >= 3
+        if horizontal and (not vertical or randint(0, 1)):
+            x, y = randint(0, w - 3), randint(0, h - 2)
+            planted = [(x, y), (x + 1, y), (x + 2, y + 1)]
+            if randint(0, 1):
+                planted = [(px, 2 * y + 1 - py) for px, py in planted]
+        elif vertical:
+            x, y = randint(0, w - 2), randint(0, h - 3)
+            planted = [(x, y), (x, y + 1), (x + 1, y + 2)]
+            if randint(0, 1):
+                planted = [(2 * x + 1 - px, py) for px, py in planted]
+        else:
+            planted = []
+        value = choice(combos)
+        for pos in planted:
+            cells[self.index(*pos)] = value
+        for i in range(len(cells)):
+            if cells[i] != EMPTY:
+                continue
+            excluded = self.run_values(i % w, i // w)
+            options = [c for c in combos if c not in excluded]
+            cells[i] = choice(options or combos)
+        self.dirty.update(range(len(cells)))
+
+    def fall_moves(self):
+        """Return (index, destination) pairs that compact every column
+        down over its empty cells. Pairs are ordered bottom up within each
+        column so each destination is empty when its jewel arrives."""
+        cells = self.cells
+        w = self.num_columns
+        moves = []
+        for x in range(w):
+            dest = (self.num_rows - 1) * w + x
+            for i in range(dest, -1, -w):
+                if cells[i] == EMPTY:
+                    continue
+                if i != dest:
+                    moves.append((i, dest))
+                dest -= w
+        return moves
+
+    def run_after_swap(self, index, other, dx, dy):
+        """Return the (x, y) indices, in board order, of the run through
+        index along (dx, dy) once index and other are swapped."""
+        cells = self.cells
+        w, h = self.num_columns, self.num_rows
+        value = cells[other]
+        x, y = index % w, index // w
+        run = [(x, y)]
+        for step in (-1, 1):
+            nx, ny = x + dx * step, y + dy * step
+            while 0 <= nx < w and 0 <= ny < h:
+                i = ny * w + nx
+                if i == other:
+                    current = cells[index]
+                else:
+                    current = cells[i]
+                if current != value:
+                    break
+                if step < 0:
+                    run.insert(0, (nx, ny))
+                else:
+                    run.append((nx, ny))
+                nx += dx * step
+                ny += dy * step
+        return run
+
+    def swap_matches(self, index1, index2):
+        """Return the runs that swapping index1 and index2 would create,
+        rows before columns as in find_matches. Only the rows and columns
+        of the two cells are inspected."""
+        cells = self.cells
+        a, b = cells[index1], cells[index2]
+        if a == b or a == EMPTY or b == EMPTY:
+            return []
+        matches = []
+        for dx, dy in ((1, 0), (0, 1)):
+            for index, other in sorted(((index1, index2), (index2, index1))):
+                run = self.run_after_swap(index, other, dx, dy)
+                if len(run) >= MIN_MATCH:
+                    matches.append(run)
+        return matches
+
+
+class MoveIndex(object):
+    """The set of legal swaps on a Board, stored as (index, other) pairs
+    with other to the right of or below index. refresh only re-examines
+    swaps within reach of the cells changed since the last refresh.
+
+    For each swap the pairs of cells that would complete a run with a
+    jewel moved into either end are worked out once up front, so checking
+    a swap is a handful of comparisons."""
+    def __init__(self, board):
+        self.board = board
+        self.moves = set()
+        w, h = board.num_columns, board.num_rows
+        swaps = [(i, i + 1) for i in range(w * h) if i % w < w - 1]
+        swaps.extend((i, i + w) for i in range(w * (h - 1)))
+        self.patterns = {(index, other): (self.run_pairs(index, other),
+                                          self.run_pairs(other, index))
+                    for index, other in swaps}
+        self.affected = {i: set() for i in range(w * h)}
+        for index, other in swaps:
+            for end in (index, other):
+                for i in self.reach(end):
+                    self.affected[i].add((index, other))
+
+    def reach(self, index):
+        """Cells within two steps of index along its row or column."""
+        w, h = self.board.num_columns, self.board.num_rows
+        x, y = index % w, index // w
+        cells = [(x + d, y) for d in range(-2, 3)]
+        cells.extend((x, y + d) for d in (-2, -1, 1, 2))
+        return [ny * w + nx for nx, ny in cells if 0 <= nx < w and 0 <= ny < h]
+
+    def run_pairs(self, index, other):
+        """Return pairs of cells that complete a run through index if both
+        hold the jewel moved there from other."""
+        w, h = self.board.num_columns, self.board.num_rows
+        x, y = index % w, index // w
+        pairs = []
+        for dx, dy in ((1, 0), (0, 1)):
+            line = {}
+            for step in (-2, -1, 1, 2):
+                nx, ny = x + dx * step, y + dy * step
+                if 0 <= nx < w and 0 <= ny < h:
+                    line[step] = ny * w + nx
+            for a, b in ((-2, -1), (-1, 1), (1, 2)):
+                if a in line and b in line and other not in (line[a], line[b]):
+                    pairs.append((line[a], line[b]))
+        return tuple(pairs)
+
+    def is_legal(self, swap):
+        cells = self.board.cells
+        index, other = swap
+        a, b = cells[index], cells[other]
+        if a == b or a == EMPTY or b == EMPTY:
+            return False
+        into_index, into_other = self.patterns[swap]
+        for p, q in into_index:
+            if cells[p] == b == cells[q]:
+                return True
+        for p, q in into_other:
+            if cells[p] == a == cells[q]:
+                return True
+        return False
+
+    def refresh(self):
+        dirty = self.board.take_dirty()
+        if not dirty:
+            return
+        affected = self.affected
+        to_check = set()
+        for index in dirty:
+            to_check.update(affected[index])
+        moves = self.moves
+        is_legal = self.is_legal
+        for swap in to_check:
+            if is_legal(swap):
+                moves.add(swap)
+            else:
+                moves.discard(swap)
+
+    def find(self):
+        """Return ((x, y), (dx, dy)) for a legal swap, or None if the
+        board has no legal moves."""
+        self.refresh()
+        if not self.moves:
+            return None
+        index, other = min(self.moves)
+        x, y = self.board.position(index)
+        ox, oy = self.board.position(other)
+        return (x, y), (ox - x, oy - y)
+
+
+class BoardPool(object):
+    """Keeps up to size generated boards ready for one set of combos.
+    Boards are generated on a daemon worker thread, so a transition
+    screen can call prepare and the next board is waiting when play
+    resumes."""
+    def __init__(self, num_columns, num_rows, size=2):
+        self.num_columns = num_columns
+        self.num_rows = num_rows
+        self.size = size
+        self.lock = threading.Lock()
+        self.combos = None
+        self.boards = []
+        self.worker = None
+
+    def prepare(self, combos):
+        """Start filling the pool for combos, dropping any boards made
+        for a different set."""
+        combos = list(combos)
+        with self.lock:
+            if combos != self.combos:
+                self.combos = combos
+                self.boards = []
+            if self.worker is None and len(self.boards) < self.size:
+                self.worker = threading.Thread(target=self.work)
+                self.worker.daemon = True
+                self.worker.start()
+
+    def work(self):
+        while True:
+            with self.lock:
+                if len(self.boards) >= self.size:
+                    self.worker = None
+                    return
+                combos = self.combos
+            board = Board(self.num_columns, self.num_rows)
+            board.generate(combos)
+            with self.lock:
+                if combos == self.combos:
+                    self.boards.append(board.cells)
+
+    def take(self, combos):
+        """Return the cells of a board generated for combos, generating
+        one now if none is ready, then top the pool back up."""
+        combos = list(combos)
+        cells = None
+        with self.lock:
+            if combos == self.combos and self.boards:
+                cells = self.boards.pop()
+        if cells is None:
+            board = Board(self.num_columns, self.num_rows)
+            board.generate(combos)
+            cells = board.cells
+        self.prepare(combos)
+        return cells
@@ -1,34 +1,48 @@
 import os
-from random import choice, shuffle
-from itertools import cycle
+from random import choice
 import json
 
 import pygame as pg
 
 from .. import prepare
 from ..components.angles import get_distance
-from ..components.animation import Animation, Task
+from ..components.animation import AnimationGroup, ANIMATION_POOL
 from ..components.labels import Label
-from ..components.jewel import Jewel
-from ..components.grid_funcs import find_repeats
+from ..components.jewel import SpinClock, JEWEL_POOL
+from ..components.board import (Board, BoardPool, MoveIndex, JEWEL_COMBOS,
+            COMBO_IDS, EMPTY)
+from ..components.rules import (LEVEL_TARGETS, MAX_BONUS, BONUS_COOLDOWN,
+            START_COMBOS, make_combos, match_points, next_level)
 from ..components.ui import GridUI, BouncingBackground
 
 
-JEWEL_COLORS = ["blue", "pink", "clear"]
-JEWEL_NUMS = [1, 4, 5, 3]
-JEWEL_COMBOS = {}
-JEWEL_COMBOS = [(color, num) for color in JEWEL_COLORS
-            for num in JEWEL_NUMS]
 ANI_SPEED = 4
 
 
 class GridCell(object):
-    def __init__(self, topleft, index, size):
+    """Rendering view of one board cell. Assigning to jewel also writes
+    the jewel's combo ID (or EMPTY) into the backing Board and adds the
+    cell to dirty, the grid's set of cells to redraw."""
+    def __init__(self, topleft, index, size, board, dirty):
         self.index = index
         w, h = size
         self.rect = pg.Rect(topleft[0] + (w * index[0]),
                     topleft[1] + (h *index[1]), w, h)
-        self.jewel = None
+        self.board = board
+        self.board_index = board.index(*index)
+        self.dirty = dirty
+        self._jewel = None
+
+    @property
+    def jewel(self):
+        return self._jewel
+
+    @jewel.setter
+    def jewel(self, jewel):
+        self._jewel = jewel
+        combo = EMPTY if jewel is None else jewel.combo_id
+        self.board.set(self.board_index, combo)
+        self.dirty.add(self)
 
     def get_neighbor_cells(self, grid):
         offsets = {
@@ -42,8 +56,9 @@ class GridCell(object):
 
     def send_jewel(self, new_cell, animations):
         dist = new_cell.rect.top - self.rect.top
-        ani = Animation(top=new_cell.rect.top, left=new_cell.rect.left,
-                    duration=int(dist*ANI_SPEED), round_values=True)
+        ani = ANIMATION_POOL.acquire(top=new_cell.rect.top,
+                    left=new_cell.rect.left, duration=int(dist*ANI_SPEED),
+                    round_values=True)
         ani.start(self.jewel.rect)
         animations.add(ani)
         new_cell.jewel = self.jewel
@@ -51,7 +66,7 @@ class GridCell(object):
 
 
 class TileGrid(object):
-    level_targets = {x: 2500 * (2**(x-1)) for x in range(1, 20)}
+    level_targets = LEVEL_TARGETS
 
     def __init__(self, topleft, num_rows, num_columns, cell_size,
                 color_scheme_num, saved=None):
@@ -61,22 +76,24 @@ class TileGrid(object):
         self.color_scheme_num = color_scheme_num
         self.rect = pg.Rect(topleft,
                     (num_columns * cell_size[0], num_rows * cell_size[1]))
+        self.spin_clock = SpinClock(60)
         self.reset()
         self.recheck = False
+        self.board_pool = BoardPool(num_columns, num_rows)
         if saved is None:
             self.score = 0
             self.elapsed = 0
-            self.max_bonus = 1000
+            self.max_bonus = MAX_BONUS
             self.bonus = int(self.max_bonus * .5)
-            self.bonus_cooldown = .01
+            self.bonus_cooldown = BONUS_COOLDOWN
             self.level = 1
-            self.num_combos = 6
-            self.jewel_combos = self.make_combos()
+            self.num_combos = START_COMBOS
+            self.use_combos(self.make_combos())
             self.make_cells(cell_size)
             self.fill_board()
         else:
             self.num_combos = saved["num combos"]
-            self.jewel_combos = saved["jewel combos"]
+            self.use_combos(saved["jewel combos"])
             self.score = saved["score"]
             self.elapsed = saved["elapsed"]
             self.bonus = saved["bonus"]
@@ -85,11 +102,19 @@ class TileGrid(object):
             self.level = saved["level"]
             self.make_cells(cell_size)
             self.load_cells(saved["jewel cells"])
+            self.prepare_board()
 
-        self.animations = pg.sprite.Group()
+        self.animations = AnimationGroup()
+        self.animations.interpolated = True
         self.points_labels = pg.sprite.Group()
-        self.points_animations = pg.sprite.Group()
-        self.spin_animations = pg.sprite.Group()
+        self.label_rects = []
+        self.jewel_layer = pg.Surface(self.rect.size).convert_alpha()
+        self.jewel_layer.fill((0, 0, 0, 0))
+        #Image of the jewel drawn on the layer for each cell showing one.
+        self.drawn_jewels = {}
+        self.points_animations = AnimationGroup()
+        self.points_animations.interpolated = True
+        self.spin_animations = AnimationGroup()
         self.background = BouncingBackground(self.rect.topleft,
                     (self.rect.w, self.rect.h + 32),
                     prepare.GFX["bg-jewels"], 60)
@@ -109,11 +134,8 @@ class TileGrid(object):
                 "max bonus": self.max_bonus,
                 "bonus cooldown": self.bonus_cooldown,
                 "level": self.level}
-        jewel_cells = []
-        for indx, cell in self.cells.items():
-            if cell.jewel is not None:
-                jewel_cells.append((indx, cell.jewel.color, cell.jewel.gem_num))
-        saved["jewel cells"] = jewel_cells
+        saved["jewel cells"] = [(indx,) + JEWEL_COMBOS[combo]
+                    for indx, combo in self.board.occupied()]
         p = os.path.join("resources", "saved.json")
         with open(p, "w") as f:
             json.dump(saved, f)
@@ -121,10 +143,17 @@ class TileGrid(object):
     def load_cells(self, cells):
         for indx, color, gem_num in cells:
             cell = self.cells[tuple(indx)]
-            cell.jewel = Jewel(cell.rect.topleft, color, gem_num)
+            cell.jewel = JEWEL_POOL.acquire(cell.rect.topleft, color,
+                        gem_num, self.spin_clock)
 
     def make_cells(self, cell_size):
-        self.cells = {(x, y): GridCell(self.topleft, (x, y), (cell_size))
+        self.board = Board(self.num_columns, self.num_rows)
+        self.moves = MoveIndex(self.board)
+        self.dirty_cells = set()
+        #Cells whose jewel was away from them or animated when last drawn.
+        self.moving_cells = set()
+        self.cells = {(x, y): GridCell(self.topleft, (x, y), cell_size,
+                                       self.board, self.dirty_cells)
                          for x in range(self.num_columns)
                          for y in range(self.num_rows)}
         for cell in self.cells:
@@ -147,109 +176,98 @@ class TileGrid(object):
         self.no_moves = False
         self.spin_speed = 100
         self.spin_timer = 0
-        self.spin_index = 0
+        self.spin_clock.index = 0
+        self.spin_clock.changed = True
         self.spin_time = 500
-        self.max_spin_index = 59
         self.score_multiplier = 1
+        self.pending_matches = None
+
+    def prepare_board(self):
+        """Start generating the next board for the current combos."""
+        self.board_pool.prepare(self.combo_ids())
 
     def make_combos(self):
-        colors = JEWEL_COLORS[:]
-        shuffle(colors)
-        colors = cycle(colors)
-        nums = cycle(JEWEL_NUMS)
+        return make_combos(self.num_combos)
 
-        combos = []
-        for _ in range(self.num_combos):
-            combos.append((next(colors), next(nums)))
-        return combos
+    def use_combos(self, jewel_combos):
+        """Set the level's combos and keep only their frames loaded."""
+        self.jewel_combos = jewel_combos
+        prepare.JEWELS.pin([tuple(combo) for combo in jewel_combos])
+
+    def combo_ids(self):
+        return [COMBO_IDS[tuple(combo)] for combo in self.jewel_combos]
 
     def fill_board(self):
+        """Swap in a board from the pool, which was generated in the
+        background if prepare_board had time to run."""
+        board = self.board
+        board.load(self.board_pool.take(self.combo_ids()))
         for cell in self.cells.values():
-            color, num = choice(self.jewel_combos)
-            cell.jewel = Jewel(cell.rect.topleft, color, num)
-        while True:
-            matches = self.find_all_matches()
-            if not matches:
-                break
-            for match in matches:
-                for indx in match:
-                    color, num = choice(self.jewel_combos)
-                    c = self.cells[indx]
-                    c.jewel = Jewel(c.rect.topleft, color, num)
+            if cell.jewel is not None:
+                JEWEL_POOL.release(cell.jewel)
+            combo = board.cells[cell.board_index]
+            color, gem_num = JEWEL_COMBOS[combo]
+            cell.jewel = JEWEL_POOL.acquire(cell.rect.topleft, color,
+                        gem_num, self.spin_clock)
 
     def fill_jewels(self):
-        for cell in self.rows[0]:
-            if cell.jewel is None:
-                topleft = cell.rect.left, cell.rect.top - cell.rect.height
+        """Spawn every missing jewel at once. After update_cells a column's
+        holes are at its top, so the new jewels are stacked the same
+        number of cells above the board and fall in together."""
+        for column in self.columns:
+            empty = [cell for cell in column if cell.jewel is None]
+            for cell in empty:
+                dist = cell.rect.height * len(empty)
+                topleft = cell.rect.left, cell.rect.top - dist
                 color, num = choice(self.jewel_combos)
-                cell.jewel = Jewel(topleft,color, num)
-                dist = cell.rect.top - cell.jewel.rect.top
-                ani = Animation(top=cell.rect.top,
+                cell.jewel = JEWEL_POOL.acquire(topleft, color, num,
+                            self.spin_clock)
+                ani = ANIMATION_POOL.acquire(top=cell.rect.top,
                             duration=int(dist*ANI_SPEED),
                             round_values=True)
                 ani.start(cell.jewel.rect)
                 self.animations.add(ani)
         self.recheck = True
 
-    def find_row_matches(self):
-        matches = []
-        for i, row in enumerate(self.rows):
-            colors = ((cell.jewel.color, cell.jewel.gem_num)
-                        if cell.jewel else None
-                        for cell in row)
-            row_matches = find_repeats(colors, 3)
-            for match in row_matches:
-                matches.append([(row_index, i) for row_index in match])
-        return matches
-
-    def find_column_matches(self):
-        matches = []
-        for i, column in enumerate(self.columns):
-            colors = ((cell.jewel.color, cell.jewel.gem_num)
-                        if cell.jewel else None
-                        for cell in column)
-            column_matches = find_repeats(colors, 3)
-            for match in column_matches:
-                matches.append([(i, column_index) for column_index in match])
-        return matches
+    def remove_jewel(self, cell):
+        """Take the jewel, if any, off cell and return it to the pool."""
+        if cell.jewel is not None:
+            JEWEL_POOL.release(cell.jewel)
+            cell.jewel = None
 
     def find_all_matches(self):
-        matches = self.find_row_matches()
-        matches.extend(self.find_column_matches())
-        return matches
+        return self.board.find_matches()
 
     def clear_matches(self, matches):
         delay = 0
         for match in sorted(matches, key=len):
-            length = len(match)
-            points_per = 10 * (length - 2)
-            score = length * points_per * self.score_multiplier * self.level
+            score, bonus = match_points(len(match), self.score_multiplier,
+                        self.level)
             self.score += score
-            self.bonus += length * points_per
+            self.bonus += bonus
             self.score_multiplier += 1
-            task = Task(self.ui.volume_slider.sounds[len(match)].play, delay)
-            self.points_animations.add(task)
+            self.points_animations.schedule(
+                        self.ui.volume_slider.sounds[len(match)].play, delay)
             delay += 250
             centers = [self.cells[m].rect.center for m in match]
             cx = sum((c[0] for c in centers)) / len(centers)
             cy = sum((c[1] for c in centers)) / len(centers)
             self.add_points_label((cx, cy), score)
             for indx in match:
-                self.cells[indx].jewel = None
+                self.remove_jewel(self.cells[indx])
         if matches:
             self.spin_up(len(matches[-1]))
 
     def spin_up(self, num):
-        self.spin_animations.empty()
         speeds = {3: 10, 4: 5, 5: 2, 6: 1, 7: 1, 8: 1}
-        spin_up = Animation(spin_speed=speeds[num],
+        spin_up = ANIMATION_POOL.acquire(spin_speed=speeds[num],
                     duration=350, round_values=True)
         spin_up.callback=self.spin_down
         spin_up.start(self)
         self.spin_animations.add(spin_up)
 
     def spin_down(self):
-        spin = Animation(spin_speed=100, duration=3500,
+        spin = ANIMATION_POOL.acquire(spin_speed=100, duration=3500,
                     round_values=True)
         spin.start(self)
         self.spin_animations.add(spin)
@@ -259,66 +277,48 @@ class TileGrid(object):
         label = Label("{}".format(points), {"center": (cx, cy + 20)},
                            self.points_labels, alpha=254, font_size=32,
                            text_color="gray90",
-                           font_path=prepare.FONTS["vipond_octic"])
+                           font_path=prepare.FONTS["vipond_octic"],
+                           glyphs=True)
         dur = 1750
-        ani = Animation(alpha=0, duration=dur, transition="in_quad")
+        ani = ANIMATION_POOL.acquire(alpha=0, duration=dur,
+                    transition="in_quad")
         ani.callback = label.kill
         ani.start(label)
 
-        ani2 = Animation(centery=cy - 20, duration=dur, round_values=True)
+        ani2 = ANIMATION_POOL.acquire(centery=cy - 20, duration=dur,
+                    round_values=True)
         ani2.start(label.rect)
         self.points_animations.add(ani, ani2)
 
     def find_moves(self):
-        for x in range(self.num_columns):
-            for y in range(self.num_rows):
-                cell = self.cells[(x, y)]
-                jewel = cell.jewel
-                for d in [(-1, 0), (1, 0), (0, -1), (0, 1)]:
-                    try:
-                        other = self.cells[(x + d[0], y + d[1])]
-                    except KeyError:
-                        continue
-                    other_jewel = other.jewel
-                    cell.jewel = other_jewel
-                    other.jewel = jewel
-                    match = self.find_all_matches()
-                    cell.jewel = jewel
-                    other.jewel = other_jewel
-                    if match:
-                        return cell.index, d
+        return self.moves.find()
 
     def check_move(self, grabbed_tile, dest_tile):
-        existing_matches = self.find_all_matches()
-        g = grabbed_tile
-        d = dest_tile
-        if g is None or d is None:
-            return False
-        gj = grabbed_tile.jewel
-        dj = dest_tile.jewel
-        if gj is None or dj is None:
-            return False
-        g.jewel = dj
-        d.jewel = gj
-        valid = self.find_all_matches()
-        g.jewel = gj
-        d.jewel =dj
-        for matched in valid:
-            if matched not in existing_matches:
-                return True
-        return False
+        """Return the matches swapping the two cells' jewels would create.
+        An empty list means the move is not valid."""
+        if grabbed_tile is None or dest_tile is None:
+            return []
+        if grabbed_tile.jewel is None or dest_tile.jewel is None:
+            return []
+        return self.board.swap_matches(grabbed_tile.board_index,
+                    dest_tile.board_index)
+
+    def queue_matches(self, matches):
+        """Schedule a recheck that clears matches found by check_move
+        instead of rescanning the board. If a recheck is already pending,
+        or cells are still waiting for jewels to fall into them, the board
+        will change before the recheck, so it will be rescanned."""
+        if self.recheck or not self.board.is_full():
+            self.pending_matches = None
+        else:
+            self.pending_matches = matches
+        self.recheck = True
 
     def spin_jewels(self, dt):
         self.spin_timer += dt
-        while self.spin_timer >= self.spin_speed:
-            self.spin_index += 1
-            if self.spin_index > self.max_spin_index:
-                self.spin_index = 0
-            self.spin_timer -= self.spin_speed
-
-            for cell in self.cells.values():
-                if cell.jewel is not None:
-                    cell.jewel.image = cell.jewel.images[self.spin_index]
+        frames, self.spin_timer = divmod(self.spin_timer, self.spin_speed)
+        if frames:
+            self.spin_clock.advance(int(frames))
 
     def make_background(self):
         img = self.bg_image_base
@@ -348,14 +348,16 @@ class TileGrid(object):
         if not self.animations:
             self.update_cells()
 
-            empty_cells = any(
-                        (cell.jewel is None for cell in self.cells.values()))
+            empty_cells = not self.board.is_full()
             if empty_cells:
                 self.fill_jewels()
             if not self.animations and self.recheck and not empty_cells:
-                matches = self.find_all_matches()
+                matches = self.pending_matches
+                if matches is None:
+                    matches = self.find_all_matches()
+                self.pending_matches = None
                 self.clear_matches(matches)
-                if not any((cell.jewel is None for cell in self.cells.values())):
+                if self.board.is_full():
                     self.possible_matches = self.find_moves()
                     if not self.possible_matches:
                         self.no_moves = True
@@ -363,13 +365,10 @@ class TileGrid(object):
         self.ui.update(dt, self)
 
     def level_up(self):
-        self.level += 1
-        if self.num_combos < 13:
-            if self.level % 2:
-                self.num_combos += 1
-        else:
-            self.bonus_cooldown += .001
-        self.jewel_combos = self.make_combos()
+        self.level, self.num_combos, self.bonus_cooldown = next_level(
+                    self.level, self.num_combos, self.bonus_cooldown)
+        self.use_combos(self.make_combos())
+        self.prepare_board()
 
     def swap_cells(self, cell1, cell2):
         jewel1 = cell1.jewel
@@ -385,27 +384,93 @@ class TileGrid(object):
             return
         dist = get_distance(jewel.rect.topleft, cell.rect.topleft)
         if dist > 0:
-            ani = Animation(top=cell.rect.top, left=cell.rect.left,
-                        duration=int(dist*3), round_values=True,
-                        transition="out_bounce")
+            ani = ANIMATION_POOL.acquire(top=cell.rect.top,
+                        left=cell.rect.left, duration=int(dist*3),
+                        round_values=True, transition="out_bounce")
             ani.start(jewel.rect)
             self.animations.add(ani)
 
     def update_cells(self):
-        for y in range(self.num_rows - 1, -1, -1):
-            for x in range(self.num_columns):
-                cell = self.cells[(x, y)]
-                if cell.jewel is not None:
-                    try:
-                        dest = self.cells[(cell.index[0], cell.index[1] + 1)]
-                        if dest.jewel is None:
-                            cell.send_jewel(dest, self.animations)
-                    except KeyError:
-                        pass
+        """Drop every jewel straight to its resting cell with a single
+        animation."""
+        position = self.board.position
+        for index, dest in self.board.fall_moves():
+            cell = self.cells[position(index)]
+            cell.send_jewel(self.cells[position(dest)], self.animations)
+
+    def dirty_rects(self):
+        """Return the areas the grid may have changed since the last call:
+        the scrolling background behind the board plus any points labels
+        that have drifted outside it."""
+        area = self.background.rect
+        rects = [label.rect.copy() for label in self.points_labels
+                    if not area.contains(label.rect)]
+        dirty = [area] + rects + self.label_rects
+        self.label_rects = rects
+        return dirty
+
+    def interpolate(self, alpha):
+        """Show moving jewels and points labels alpha of the way from where
+        the update before last left them to where the last one did."""
+        self.animations.interpolate(alpha)
+        self.points_animations.interpolate(alpha)
+
+    def restore(self):
+        """Put the jewels and labels back where the last update left them."""
+        self.animations.restore()
+        self.points_animations.restore()
+
+    def mark_dirty(self, *cells):
+        """Have the jewel layer recheck cells whose jewel was moved by
+        hand rather than by assigning it or animating it."""
+        for cell in cells:
+            if cell is not None:
+                self.dirty_cells.add(cell)
+
+    def update_jewel_layer(self):
+        """Redraw the cells of the jewel layer marked dirty since the last
+        call, and those whose jewel was moving, so the work follows what
+        changed rather than the size of the board. A spin frame redraws
+        every jewel at rest. Returns the jewels away from their cells or
+        animated, which can overlap others and are drawn straight to the
+        screen instead."""
+        dirty = self.dirty_cells
+        if self.spin_clock.changed:
+            self.spin_clock.changed = False
+            dirty.update(self.drawn_jewels)
+        cells = dirty | self.moving_cells
+        dirty.clear()
+        drawn = self.drawn_jewels
+        layer = self.jewel_layer
+        dx, dy = -self.rect.left, -self.rect.top
+        for cell in cells:
+            jewel = cell.jewel
+            image = None
+            if jewel is None:
+                self.moving_cells.discard(cell)
+            elif (jewel.rect.topleft == cell.rect.topleft
+                        and not self.animations.is_animating(jewel.rect)):
+                image = jewel.image
+                self.moving_cells.discard(cell)
+            else:
+                self.moving_cells.add(cell)
+            last = drawn.get(cell)
+            if last is image:
+                continue
+            topleft = cell.rect.left + dx, cell.rect.top + dy
+            if last is not None:
+                layer.fill((0, 0, 0, 0), last.get_rect(topleft=topleft))
+                del drawn[cell]
+            if image is not None:
+                layer.blit(image, topleft)
+                drawn[cell] = image
+        moving = sorted(self.moving_cells, key=lambda cell: cell.index)
+        return [cell.jewel for cell in moving]
 
     def draw(self, surface):
         self.background.draw(surface)
-        for cell in self.cells.values():
-            if cell.jewel is not None:
-                cell.jewel.draw(surface)
+        moving = self.update_jewel_layer()
+        surface.blit(self.jewel_layer, self.rect)
+        for jewel in moving:
+            jewel.draw(surface)
         self.points_labels.draw(surface)
\ No newline at end of file
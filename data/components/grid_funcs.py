@@ -1,42 +1,107 @@
+"""Whole-board match detection.
 
-def find_repeats(iterable, min_length, excludes=None):
-    excludes = [None] if excludes is None else excludes
-    matches = []
-    potential = None
-    for i, x in enumerate(iterable):
-        if potential is None:
-            if x not in excludes:
-                potential = [(i, x)]
-        else:
-            if potential[-1][1] == x:
-                potential.append((i, x))
-            else:
-                if len(potential) >= min_length:
-                    matches.append((p[0] for p in potential))
-                potential = [(i, x)]
-    if potential and len(potential) >= min_length:
-        matches.append((p[0] for p in potential))
-    return matches
+find_grid_runs takes a board stored row by row in a flat buffer and returns
+every horizontal run followed by every vertical run of min_length or more
+equal, non-empty values as lists of (x, y) indices. When NumPy is available
+runs on larger boards are found for the whole board at once with
+shifted-array comparisons; otherwise a pure Python scan of the flat buffer
+is used (it is also quicker for small boards like the default 8x8)."""
 
-def find_row_matches(nested_list, min_length, excludes=None):
-    matches = []
-    for j, row in enumerate(nested_list):
-        row_indexes = find_repeats(row, min_length, excludes)
-        for repeats in row_indexes:
-            matches.append([(x, j) for x in repeats])
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+#Boards with fewer cells than this are scanned in pure Python even when
+#NumPy is available, as array setup costs more than the scan itself.
+NUMPY_MIN_CELLS = 256
+
+
+#Row-major and column-major lists of (x, y) tuples keyed by board size.
+#Each run is returned as a slice of one of these lists.
+POSITIONS = {}
+
+
+def _get_positions(num_columns, num_rows):
+    size = num_columns, num_rows
+    if size not in POSITIONS:
+        by_row = [(x, y) for y in range(num_rows)
+                    for x in range(num_columns)]
+        by_column = [(x, y) for x in range(num_columns)
+                    for y in range(num_rows)]
+        POSITIONS[size] = by_row, by_column
+    return POSITIONS[size]
+
+
+def _runs_numpy(grid, min_length, empty):
+    """Return (flat start index, length) pairs for the runs along the
+    rows of a 2D array. Runs are found as stretches of overlapping
+    triples, so min_length must be at least 3."""
+    h, w = grid.shape
+    if w < 3:
+        return []
+    triples = ((grid[:, :-2] == grid[:, 1:-1]) & (grid[:, 1:-1] == grid[:, 2:])
+                & (grid[:, :-2] != empty))
+    padded = np.zeros((h, w), dtype=bool)
+    padded[:, 1:-1] = triples
+    edges = padded[:, 1:] != padded[:, :-1]
+    flat_edges = np.flatnonzero(edges)
+    starts = flat_edges[::2]
+    ends = flat_edges[1::2]
+    lengths = ends - starts + 2
+    starts = starts + starts // (w - 1)
+    found = lengths >= min_length
+    return zip(starts[found].tolist(), lengths[found].tolist())
+
+
+def _find_grid_runs_numpy(cells, num_columns, num_rows, min_length, empty):
+    grid = np.frombuffer(cells, dtype=np.int8).reshape(num_rows, num_columns)
+    by_row, by_column = _get_positions(num_columns, num_rows)
+    matches = [by_row[start:start + length]
+                for start, length in _runs_numpy(grid, min_length, empty)]
+    matches.extend(by_column[start:start + length]
+                for start, length in _runs_numpy(grid.T, min_length, empty))
     return matches
 
-def find_column_matches(nested_list, min_length, excludes=None):
+
+def _find_grid_runs_python(cells, num_columns, num_rows, min_length, empty):
+    w, h = num_columns, num_rows
+    by_row, by_column = _get_positions(w, h)
     matches = []
-    num_columns = len(nested_list[0])
-    for i in range(num_columns):
-        column = [row[i] for row in nested_list]
-        column_indexes = find_repeats(column, min_length, excludes)
-        for repeats in column_indexes:
-            matches.append([(i, y) for y in repeats])
+    for y in range(h):
+        start = y * w
+        run = 1
+        for x in range(1, w + 1):
+            if (x < w and cells[start + x] != empty
+                        and cells[start + x] == cells[start + x - 1]):
+                run += 1
+                continue
+            if run >= min_length:
+                matches.append(by_row[start + x - run:start + x])
+            run = 1
+    for x in range(w):
+        run = 1
+        for y in range(1, h + 1):
+            i = y * w + x
+            if y < h and cells[i] != empty and cells[i] == cells[i - w]:
+                run += 1
+                continue
+            if run >= min_length:
+                matches.append(by_column[x * h + y - run:x * h + y])
+            run = 1
     return matches
 
-def find_grid_matches(nested_list, min_length, excludes=None):
-    matches = find_row_matches(nested_list, min_length, excludes)
-    matches.extend(find_column_matches(nested_list, min_length, excludes))
-    return matches
+
+def find_grid_runs(cells, num_columns, num_rows, min_length, empty):
+    """Find all runs in a row-major buffer of signed chars.
+
+    cells: array("b") (or any int8 buffer) of num_columns * num_rows values
+    min_length: shortest run to report, at least 3
+    empty: value that never forms part of a run
+    """
+    if np is not None and num_columns * num_rows >= NUMPY_MIN_CELLS:
+        return _find_grid_runs_numpy(cells, num_columns, num_rows,
+                    min_length, empty)
+    return _find_grid_runs_python(cells, num_columns, num_rows,
+                min_length, empty)
@@ -4,16 +4,51 @@ from random import randint
 import pygame as pg
 
 from .. import tools, prepare
+from ..components.board import combo_id
+from ..components.pool import Pool
+
+
+class SpinClock(object):
+    """The spin frame shown by every jewel that shares it. Jewels look up
+    their image when drawn, so advancing the spin takes the same time
+    however many jewels there are. changed is set when the frame moves
+    on, for whatever caches the jewels' images to clear."""
+    def __init__(self, num_frames):
+        self.num_frames = num_frames
+        self.index = 0
+        self.changed = True
+
+    def advance(self, frames):
+        self.index = (self.index + frames) % self.num_frames
+        self.changed = True
 
 
 class Jewel(pg.sprite.Sprite):
-    def __init__(self, topleft, color, gem_num, *groups):
+    def __init__(self, topleft, color, gem_num, clock, *groups):
         super(Jewel, self).__init__(*groups)
+        self.pool = None
+        self.rect = None
+        self.reset(topleft, color, gem_num, clock)
+
+    def reset(self, topleft, color, gem_num, clock):
         self.color = color
         self.gem_num = gem_num
-        self.images = prepare.JEWELS[color][gem_num]
-        self.image = self.images[0]
-        self.rect = self.image.get_rect(topleft=topleft)
+        self.combo_id = combo_id(color, gem_num)
+        self.images = prepare.JEWELS[color, gem_num]
+        self.clock = clock
+        if self.rect is None:
+            self.rect = self.image.get_rect(topleft=topleft)
+        else:
+            self.rect.size = self.image.get_size()
+            self.rect.topleft = topleft
+
+    @property
+    def image(self):
+        return self.images[self.clock.index]
 
     def draw(self, surface):
-        surface.blit(self.image, self.rect)
\ No newline at end of file
+        surface.blit(self.image, self.rect)
+
+
+#Jewels cleared from the board are reused for the ones that replace them.
+JEWEL_POOL = Pool(Jewel)
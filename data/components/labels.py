@@ -12,6 +12,13 @@ from .. import prepare, tools
 #font already exists in LOADED_FONTS.
 LOADED_FONTS = {}
 
+#GlyphAtlas objects keyed by (font_path, font_size, text color).
+GLYPH_ATLASES = {}
+
+#Characters a GlyphAtlas renders when it is made. Others are rendered
+#and added the first time they are drawn.
+GLYPH_CHARS = string.digits + " +-,.:x"
+
 #Default values for Button objects - see Button class for specifics
 BUTTON_DEFAULTS = {
         "button_size": (128, 32),
@@ -44,7 +51,8 @@ LABEL_DEFAULTS = {
         "font_size": 12,
         "text_color": "white",
         "fill_color": None,
-        "alpha": 255}
+        "alpha": 255,
+        "glyphs": False}
 
 MULTILINE_LABEL_DEFAULTS = {
         "font_path": None,
@@ -137,6 +145,74 @@ def _parse_color(color):
     return color
 
 
+def glyph_atlas(font_path, font_size, color):
+    """Return the GlyphAtlas for a font, size and color, making it the
+    first time it is asked for."""
+    key = font_path, font_size, tuple(color)
+    if key not in GLYPH_ATLASES:
+        if (font_path, font_size) not in LOADED_FONTS:
+            LOADED_FONTS[(font_path, font_size)] = pg.font.Font(font_path,
+                        font_size)
+        font = LOADED_FONTS[(font_path, font_size)]
+        GLYPH_ATLASES[key] = GlyphAtlas(font, color)
+    return GLYPH_ATLASES[key]
+
+
+class GlyphAtlas(object):
+    """Antialiased glyphs of one font and color rendered side by side on a
+    single surface. render draws strings by blitting glyphs from it, so
+    text made of characters already in the atlas never goes through the
+    font again."""
+    def __init__(self, font, color, chars=GLYPH_CHARS):
+        self.font = font
+        self.color = color
+        self.height = font.get_height()
+        self.image = pg.Surface((0, self.height), pg.SRCALPHA)
+        self.areas = {}
+        self.add(chars)
+
+    def add(self, chars):
+        """Render the chars not yet in the atlas and append them to it."""
+        new = []
+        for char in chars:
+            if char not in self.areas and char not in new:
+                new.append(char)
+        if not new:
+            return
+        glyphs = [self.font.render(char, True, self.color) for char in new]
+        left = self.image.get_width()
+        width = left + sum(glyph.get_width() for glyph in glyphs)
+        image = pg.Surface((width, self.height), pg.SRCALPHA)
+        image.fill((0, 0, 0, 0))
+        #Copy the pixels as they are rather than blending them.
+        image.blit(self.image, (0, 0), special_flags=pg.BLEND_RGBA_MAX)
+        for char, glyph in zip(new, glyphs):
+            image.blit(glyph, (left, 0), special_flags=pg.BLEND_RGBA_MAX)
+            self.areas[char] = pg.Rect(left, 0, glyph.get_width(),
+                        self.height)
+            left += glyph.get_width()
+        self.image = image
+
+    def render(self, text, fill_color=None):
+        """Return a surface with text drawn on it, on a background of
+        fill_color or a transparent one if fill_color is None."""
+        self.add(text)
+        areas = [self.areas[char] for char in text]
+        width = sum(area.w for area in areas)
+        surface = pg.Surface((width, self.height), pg.SRCALPHA)
+        if fill_color:
+            surface.fill(fill_color)
+            flags = 0
+        else:
+            surface.fill((0, 0, 0, 0))
+            flags = pg.BLEND_RGBA_MAX
+        left = 0
+        for area in areas:
+            surface.blit(self.image, (left, 0), area, special_flags=flags)
+            left += area.w
+        return surface
+
+
 class Label(pg.sprite.Sprite, tools._KwargMixin):
     """
     Parent class all labels inherit from. Color arguments can use color names
@@ -166,6 +242,8 @@ class Label(pg.sprite.Sprite, tools._KwargMixin):
                        accepts pygame.Color object, RGB tuple or colorname string
                        background will be transparent if None
         alpha: surface alpha
+        glyphs: draw the text from the GlyphAtlas of its font, size and
+                   color instead of rendering it, for numbers that change often
 
         args that are not passed will use the default values in LABEL_DEFAULTS
         """
@@ -187,6 +265,14 @@ class Label(pg.sprite.Sprite, tools._KwargMixin):
 
     def update_text(self):
         """Update the surface using the current properties and text."""
+        if self.glyphs:
+            atlas = glyph_atlas(self.font_path, self.font_size,
+                        self.text_color)
+            self.image = atlas.render(self.text, self.fill_color)
+            if self.alpha != 255:
+                self.image.set_alpha(self.alpha)
+            self.rect = self.image.get_rect(**self.rect_attr)
+            return
         if self.alpha != 255:
             self.fill_color = pg.Color(*[x + 1 if x < 255 else x - 1 for x in self.text_color[:3]])
         if self.fill_color:
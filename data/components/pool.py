@@ -0,0 +1,38 @@
+"""Free lists for objects that are made and thrown away many times a
+second, such as the animations and jewels of a cascade. Reusing them
+keeps the allocation rate, and so the garbage collector's work, down."""
+
+
+class Pool(object):
+    """Hands out objects made by factory, reusing released ones.
+
+    acquire takes the same arguments as factory and passes them to the
+    reset method of a reused object, which must set it up as the
+    factory would. At most limit released objects are kept."""
+    def __init__(self, factory, limit=256):
+        self.factory = factory
+        self.limit = limit
+        self.free = []
+        self.made = 0
+        self.reused = 0
+
+    def acquire(self, *args, **kwargs):
+        if self.free:
+            obj = self.free.pop()
+            obj.reset(*args, **kwargs)
+            self.reused += 1
+        else:
+            obj = self.factory(*args, **kwargs)
+            self.made += 1
+        obj.pool = self
+        obj.pooled = False
+        return obj
+
+    def release(self, obj):
+        """Return obj to the pool. Releasing it again before it is next
+        acquired does nothing."""
+        if obj.pooled:
+            return
+        obj.pooled = True
+        if len(self.free) < self.limit:
+            self.free.append(obj)
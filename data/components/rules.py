@@ -0,0 +1,201 @@
+"""Game rules with no display or pygame dependency.
+
+TileGrid and the gameplay states use the functions here for scoring,
+levelling and bonus decay. Game plays whole games on a Board with no
+animation so they can be simulated in bulk."""
+
+from random import choice, shuffle
+from itertools import cycle
+
+from .board import (Board, MoveIndex, JEWEL_COLORS, JEWEL_NUMS, COMBO_IDS,
+            EMPTY)
+
+
+TARGET_BASE = 2500
+MAX_BONUS = 1000
+BONUS_COOLDOWN = .01
+START_COMBOS = 6
+MAX_COMBOS = 13
+COMBO_INTERVAL = 2
+COOLDOWN_STEP = .001
+#Milliseconds Gameplay spends swapping two 64 pixel cells (3.5ms per
+#pixel) and dropping a jewel one cell (grid.ANI_SPEED of 4ms per pixel).
+SWAP_TIME = 224
+FALL_TIME = 256
+
+
+def make_combos(num_combos):
+    """Return a list of num_combos (color, gem_num) pairs for a level."""
+    colors = JEWEL_COLORS[:]
+    shuffle(colors)
+    colors = cycle(colors)
+    nums = cycle(JEWEL_NUMS)
+    return [(next(colors), next(nums)) for _ in range(num_combos)]
+
+
+def match_points(length, multiplier, level):
+    """Return (score, bonus) earned by clearing a match of length."""
+    points_per = 10 * (length - 2)
+    score = length * points_per * multiplier * level
+    return score, length * points_per
+
+
+def make_level_targets(base):
+    """Return level targets that start at base and double each level."""
+    return {x: base * (2**(x-1)) for x in range(1, 20)}
+
+
+LEVEL_TARGETS = make_level_targets(TARGET_BASE)
+
+
+def next_level(level, num_combos, bonus_cooldown,
+            combo_interval=COMBO_INTERVAL, cooldown_step=COOLDOWN_STEP):
+    """Return (level, num_combos, bonus_cooldown) after a level up. A
+    combo is added every combo_interval levels until there are
+    MAX_COMBOS, after which the bonus drains cooldown_step faster each
+    level."""
+    level += 1
+    if num_combos < MAX_COMBOS:
+        if level % combo_interval == 1 % combo_interval:
+            num_combos += 1
+    else:
+        bonus_cooldown += cooldown_step
+    return level, num_combos, bonus_cooldown
+
+
+def decay_bonus(bonus, bonus_cooldown, dt):
+    """Return the bonus left after dt milliseconds."""
+    return bonus - bonus_cooldown * dt
+
+
+class Game(object):
+    """A game played directly on a Board: swaps resolve their whole
+    cascade immediately, charging the time Gameplay would spend animating
+    it, and the player's own time passes when update is called."""
+    def __init__(self, num_columns=8, num_rows=8, level_targets=LEVEL_TARGETS,
+                max_bonus=MAX_BONUS, bonus_cooldown=BONUS_COOLDOWN,
+                num_combos=START_COMBOS, combo_interval=COMBO_INTERVAL,
+                cooldown_step=COOLDOWN_STEP):
+        self.level_targets = level_targets
+        self.combo_interval = combo_interval
+        self.cooldown_step = cooldown_step
+        self.max_bonus = max_bonus
+        self.bonus = int(max_bonus * .5)
+        self.bonus_cooldown = bonus_cooldown
+        self.num_combos = num_combos
+        self.score = 0
+        self.elapsed = 0
+        self.level = 1
+        self.moves_made = 0
+        self.board = Board(num_columns, num_rows)
+        self.moves = MoveIndex(self.board)
+        self.set_combos(make_combos(self.num_combos))
+        self.new_board()
+
+    @property
+    def done(self):
+        return self.bonus <= 0
+
+    def set_combos(self, jewel_combos):
+        self.jewel_combos = jewel_combos
+        self.combos = [COMBO_IDS[tuple(combo)] for combo in jewel_combos]
+
+    def new_board(self):
+        self.board.generate(self.combos)
+
+    def legal_moves(self):
+        """Return a list of (index, other) swaps that create a match."""
+        self.moves.refresh()
+        return list(self.moves.moves)
+
+    def clear_matches(self, matches, multiplier):
+        """Score and empty matches as TileGrid.clear_matches does and
+        return the next score multiplier."""
+        board = self.board
+        for match in sorted(matches, key=len):
+            score, bonus = match_points(len(match), multiplier, self.level)
+            self.score += score
+            self.bonus += bonus
+            multiplier += 1
+            for pos in match:
+                board[pos] = EMPTY
+        return multiplier
+
+    def elapse(self, dt):
+        """Advance the clock by dt milliseconds, draining the bonus."""
+        self.elapsed += dt
+        self.bonus = decay_bonus(self.bonus, self.bonus_cooldown, dt)
+
+    def refill(self):
+        """Drop the jewels over empty cells and fill the gaps, charging
+        the time the deepest column takes to fall."""
+        board = self.board
+        w = board.num_columns
+        holes = max(board.cells[x::w].count(EMPTY) for x in range(w))
+        self.elapse(holes * FALL_TIME)
+        for index, dest in board.fall_moves():
+            board.set(dest, board.cells[index])
+            board.set(index, EMPTY)
+        combos = self.combos
+        for i, combo in enumerate(board.cells):
+            if combo == EMPTY:
+                board.set(i, choice(combos))
+
+    def swap(self, index, other):
+        """Swap two cells and resolve the resulting cascade. Returns the
+        points scored; an illegal swap scores nothing and is not made."""
+        board = self.board
+        matches = board.swap_matches(index, other)
+        if not matches:
+            return 0
+        self.moves_made += 1
+        start = self.score
+        cells = board.cells
+        a, b = cells[index], cells[other]
+        board.set(index, b)
+        board.set(other, a)
+        self.elapse(SWAP_TIME)
+        multiplier = 1
+        while matches:
+            multiplier = self.clear_matches(matches, multiplier)
+            self.refill()
+            matches = board.find_matches()
+        return self.score - start
+
+    def update(self, dt):
+        """Advance the clock by dt milliseconds and apply the same state
+        changes as the transition screens: game over when the bonus runs
+        out, a bonus clear when it fills, a level up when the score
+        reaches its target and a new board when no moves are left."""
+        self.elapse(dt)
+        if self.done:
+            return
+        if self.bonus >= self.max_bonus:
+            self.clear_bonus(choice(self.combos))
+        target = self.level_targets.get(self.level)
+        if target is not None and self.score >= target:
+            self.level_up()
+        elif not self.legal_moves():
+            self.new_board()
+
+    def clear_bonus(self, combo):
+        """Remove every jewel of one combo, as ClearBonus does."""
+        self.bonus = self.max_bonus // 2
+        board = self.board
+        for i, value in enumerate(board.cells):
+            if value == combo:
+                board.set(i, EMPTY)
+        self.refill()
+        multiplier = 1
+        matches = board.find_matches()
+        while matches:
+            multiplier = self.clear_matches(matches, multiplier)
+            self.refill()
+            matches = board.find_matches()
+
+    def level_up(self):
+        self.level, self.num_combos, self.bonus_cooldown = next_level(
+                    self.level, self.num_combos, self.bonus_cooldown,
+                    self.combo_interval, self.cooldown_step)
+        self.set_combos(make_combos(self.num_combos))
+        self.new_board()
@@ -7,10 +7,25 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.angles import get_distance
-from ..components.animation import Animation
+from ..components.animation import Animation, AnimationGroup
 from ..components.labels import Label, Blinker, Button, ButtonGroup
 
 
+def settle(image):
+    """Return a copy of image with every pixel that is not fully
+    transparent made opaque. An alpha overlay blitted over itself frame
+    after frame converges to this, so it stands in for one that has been
+    drawn many times over areas nothing else redraws."""
+    mask = image.copy()
+    mask.fill((255, 255, 255, 0), special_flags=pg.BLEND_RGBA_MAX)
+    for _ in range(8):
+        mask.blit(mask, (0, 0), special_flags=pg.BLEND_RGBA_ADD)
+    settled = image.copy()
+    settled.fill((0, 0, 0, 255), special_flags=pg.BLEND_RGBA_MAX)
+    settled.blit(mask, (0, 0), special_flags=pg.BLEND_RGBA_MULT)
+    return settled
+
+
 class ScreenSprite(pg.sprite.Sprite):
     def __init__(self,center, image, *groups):
         super(ScreenSprite, self).__init__(*groups)
@@ -31,6 +46,7 @@ class GridUI(object):
                     self.buttons, idle_image=img, button_size=img.get_size(),
                     call=self.quit_game)
         self.volume_slider = VolumeSlider((910, 20))
+        self.last_snapshot = None
 
     def quit_game(self, *args):
         self.quit = True
@@ -40,7 +56,8 @@ class GridUI(object):
         self.level_label = Label("Level {}".format(grid.level),
                     {"midtop": (182, 16)}, self.labels, font_size=64)
         self.score_label = Label("{}".format(grid.score),
-                    {"midtop": (182, 64)}, self.labels, font_size=48)
+                    {"midtop": (182, 64)}, self.labels, font_size=48,
+                    glyphs=True)
         target = grid.level_targets[grid.level]
         self.next_level_label = Label("Next Level {}".format(target),
                     {"midtop": (182, 128)}, self.labels, font_size=24)
@@ -65,6 +82,39 @@ class GridUI(object):
         self.high_scores_table.update(dt, grid.score)
         self.volume_slider.update()
 
+    def snapshot(self):
+        """Return (rect, look) pairs for each part of the UI, where look
+        changes whenever what is drawn inside rect does."""
+        labels = [self.level_label, self.score_label, self.next_level_label]
+        bar = self.bonus_bar
+        slider = self.volume_slider
+        scores = self.high_scores_table
+        parts = [
+                    (labels[0].rect.unionall([label.rect for label in labels]),
+                     tuple(label.text for label in labels)),
+                    (bar.rect, (bar.width, tuple(bar.draw_color))),
+                    (scores.rect,
+                     tuple(label.image for label in scores.score_labels)),
+                    (slider.rect, (slider.slider_rect.left, slider.muted))]
+        parts.extend((button.rect, button.image) for button in self.buttons)
+        return parts
+
+    def dirty_rects(self):
+        """Return the areas that changed since the last call, covering both
+        where a part was and where it is now. Call it once per frame drawn,
+        as several updates may run between frames."""
+        snapshot = self.snapshot()
+        last = self.last_snapshot
+        if last is None or len(last) != len(snapshot):
+            rects = [rect for rect, look in snapshot]
+        else:
+            rects = [rect.union(old_rect)
+                        for (rect, look), (old_rect, old_look)
+                        in zip(snapshot, last)
+                        if look != old_look or rect != old_rect]
+        self.last_snapshot = snapshot
+        return rects
+
     def draw(self, surface):
         self.labels.draw(surface)
         self.buttons.draw(surface)
@@ -114,11 +164,11 @@ class HighScoresTable(pg.sprite.Sprite):
         for score in scores:
             if score == self.player_score and current is None:
                 Blinker("{}".format(score), {"topright": (right, top)}, 500,
-                            self.score_labels, font_size=40)
+                            self.score_labels, font_size=40, glyphs=True)
                 current = True
             else:
                 Label("{}".format(score), {"topright": (right, top)},
-                            self.score_labels, font_size=40)
+                            self.score_labels, font_size=40, glyphs=True)
             top += 35
 
     def update(self, dt, score):
@@ -132,7 +182,7 @@ class HighScoresTable(pg.sprite.Sprite):
 
 class BonusBar(pg.sprite.Sprite):
     def __init__(self, topleft, value, max_value):
-        self.animations = pg.sprite.Group()
+        self.animations = AnimationGroup()
         self.value = value
         self.max_value = max_value
         self.rect = pg.Rect(topleft, (514, 18))
@@ -142,6 +192,7 @@ class BonusBar(pg.sprite.Sprite):
         self.colors = cycle(colors)
         self.color_change_duration = 1000
         self.color = self.draw_color = next(self.colors)
+        self.width = 0
         self.next_color = next(self.colors)
         self.change_color()
         self.image = pg.Surface(self.rect.size)
@@ -168,10 +219,10 @@ class BonusBar(pg.sprite.Sprite):
 
     def make_image(self):
         self.image.fill((0, 0, 0))
-        w = int((self.value / float(self.max_value)) * self.rect.w)
+        self.width = int((self.value / float(self.max_value)) * self.rect.w)
         self.bar_image.fill((0, 0, 0))
         pg.draw.rect(self.bar_image, pg.Color(*self.draw_color),
-                    (0, 0, w, self.rect.h))
+                    (0, 0, self.width, self.rect.h))
 
     def update(self, dt, value):
         self.animations.update(dt)
@@ -218,6 +269,8 @@ class VolumeSlider(pg.sprite.Sprite):
         self.slider_box.centery =  self.icon_rect.centery
         self.slider_rect = self.slider_image.get_rect(
                     center=self.slider_box.center)
+        self.rect = self.icon_rect.unionall([self.slider_box,
+                    self.slider_rect])
         self.volume = 0.
         self.set_volume()
         self.grabbed = False
@@ -262,20 +315,103 @@ class VolumeSlider(pg.sprite.Sprite):
         surface.blit(self.slider_image, self.slider_rect)
 
 
-class ScreenBackground(object):
-    def __init__(self, image, rects):
-        self.image = image
-        self.images = [(image.subsurface(rect), pg.Rect(rect))
-                    for rect in rects]
+class LoadingSplash(object):
+    """The crystal frame with a bar showing how much has loaded."""
+    def __init__(self):
+        self.rect = pg.Rect(0, 0, 514, 18)
+        self.rect.center = prepare.SCREEN_RECT.center
+        self.bg_color = pg.Color("gray20")
+        self.color = pg.Color(0, 227, 255)
+
+    def draw(self, surface, progress):
+        surface.fill(pg.Color("black"))
+        surface.blit(prepare.GFX["crystal-frame"], (0, 0))
+        surface.fill(self.bg_color, self.rect)
+        bar = self.rect.copy()
+        bar.w = int(progress * self.rect.w)
+        surface.fill(self.color, bar)
+
+
+#Size of the tiles overlays are cut into by ScreenLayers.
+OVERLAY_TILE_SIZE = 32
+
+
+#ScreenLayers for each screen, built on first use and shared by every
+#state that draws that screen.
+SCREEN_LAYERS = {}
+
+
+class ScreenLayers(object):
+    """Static layers of a screen flattened once, so a state draws its
+    dynamic content between draw_underlay and draw_overlay.
+
+    background: full screen image drawn by clear
+    panel_rects: areas of background redrawn under dynamic content
+    overlays: (image, topleft) pairs drawn over dynamic content
+    live_rects: other areas dynamic content is drawn in
+
+    The overlays are merged into one image and cut into tiles, keeping
+    only tiles that have visible pixels over a panel or live area, each
+    cropped to those pixels. Overlay outside those areas never has
+    anything drawn under it, so it is baked into the backdrop clear draws,
+    settled as if drawn over itself many times."""
+    def __init__(self, background, panel_rects, overlays, live_rects):
+        self.underlay = [(background.subsurface(rect), pg.Rect(rect))
+                    for rect in panel_rects]
+        merged = pg.Surface(background.get_size()).convert_alpha()
+        merged.fill((0, 0, 0, 0))
+        for image, topleft in overlays:
+            merged.blit(image, topleft)
+        self.backdrop = background.copy()
+        self.backdrop.blit(settle(merged), (0, 0))
+        live = [pg.Rect(rect) for rect in list(panel_rects) + list(live_rects)]
+        self.overlay = self.cut_tiles(merged, live, OVERLAY_TILE_SIZE)
+
+    def cut_tiles(self, image, live, tile_size):
+        tiles = []
+        w, h = image.get_size()
+        for top in range(0, h, tile_size):
+            for left in range(0, w, tile_size):
+                tile = pg.Rect(left, top, tile_size, tile_size).clip(
+                            image.get_rect())
+                if tile.collidelist(live) == -1:
+                    continue
+                bounds = image.subsurface(tile).get_bounding_rect()
+                if not bounds.w or not bounds.h:
+                    continue
+                bounds.move_ip(tile.topleft)
+                piece = image.subsurface(bounds).copy()
+                opaque = pg.mask.from_surface(piece, 254).count()
+                if opaque == bounds.w * bounds.h:
+                    piece = piece.convert()
+                tiles.append((piece, bounds))
+        return tiles
 
     def clear(self, surface):
-        surface.blit(self.image, (0, 0))
+        surface.blit(self.backdrop, (0, 0))
 
-    def draw(self, surface):
-        for image, rect in self.images:
+    def draw_underlay(self, surface):
+        for image, rect in self.underlay:
+            surface.blit(image, rect)
+
+    def draw_overlay(self, surface):
+        for image, rect in self.overlay:
             surface.blit(image, rect)
 
 
+def gameplay_layers():
+    """Return the ScreenLayers shared by Gameplay and its overlay
+    screens: the panels behind the labels and high scores, and the
+    crystal frames over everything."""
+    if "gameplay" not in SCREEN_LAYERS:
+        SCREEN_LAYERS["gameplay"] = ScreenLayers(prepare.GFX["bg-screen"],
+                    [(0, 0, 378, 150), (904, 4, 371, 544)],
+                    [(prepare.GFX["crystal-frame"], (0, 0)),
+                     (prepare.GFX["crystal-frame2"], (374, 0))],
+                    [(374, 0, 532, 557)])
+    return SCREEN_LAYERS["gameplay"]
+
+
 class BouncingBackground(pg.sprite.Sprite):
     def __init__(self, topleft, view_size, image, speed, *groups):
         super(BouncingBackground, self).__init__(*groups)
@@ -286,7 +422,7 @@ class BouncingBackground(pg.sprite.Sprite):
         self.bounce_rect = self.rect.copy()
         self.bounce_rect.center = self.base_rect.center
         self.image = self.base_image.subsurface(self.bounce_rect)
-        self.animations = pg.sprite.Group()
+        self.animations = AnimationGroup()
 
     def update(self, dt):
         self.animations.update(dt)
@@ -313,7 +449,7 @@ class StainedGlass(pg.sprite.Sprite):
     def __init__(self, center, image, cover_image, colors, alpha,
                 color_change_duration, *groups):
         super(StainedGlass, self).__init__(*groups)
-        self.animations = pg.sprite.Group()
+        self.animations = AnimationGroup()
         self.frame = image
         self.rect = self.frame.get_rect(center=center)
         self.image = pg.Surface(self.rect.size).convert_alpha()
@@ -1,9 +1,13 @@
 from . import prepare,tools
+from .components.ui import LoadingSplash
 from .states import (title_screen, gameplay, game_over, no_moves_screen,
             level_up, bonus_screen, clear_bonus, pause_screen)
 
 def main():
-    controller = tools.Control(prepare.ORIGINAL_CAPTION)
+    controller = tools.Control(prepare.ORIGINAL_CAPTION, prepare.SYNCED)
+    controller.load(prepare.LOADER, LoadingSplash(), "title")
+    if controller.done:
+        return
     states = {"TITLE": title_screen.TitleScreen(),
                    "GAMEPLAY": gameplay.Gameplay(),
                    "GAMEOVER": game_over.GameOver(),
@@ -1,39 +1,105 @@
 import os
+from functools import partial
 import pygame as pg
 from . import tools
+from .assets import AssetCache, AssetManager, AssetLoader, surface_bytes
 
 
 SCREEN_SIZE = (1280, 720)
 ORIGINAL_CAPTION = "Game"
+#Sync drawing to the monitor's refresh instead of capping the frame rate.
+VSYNC = False
 
 pg.mixer.pre_init(44100, -16, 1, 512)
 
 pg.init()
 os.environ['SDL_VIDEO_CENTERED'] = "TRUE"
 pg.display.set_caption(ORIGINAL_CAPTION)
-SCREEN = pg.display.set_mode(SCREEN_SIZE, pg.NOFRAME)
+SCREEN, SYNCED = tools.set_display_mode(SCREEN_SIZE, pg.NOFRAME, VSYNC)
 SCREEN_RECT = SCREEN.get_rect()
 
+#Decoded images and sounds from earlier runs.
+CACHE = AssetCache(os.path.join("resources", "cache", "assets.bin"))
+#Bytes of graphics and jewel frames kept loaded once they are no longer
+#in use. Those the current level needs stay loaded regardless.
+ASSET_BUDGET = 24 * 1024 * 1024
+ASSETS = AssetManager(ASSET_BUDGET)
+
+
+def load_graphic(path):
+    image = CACHE.load_image(path, (255, 0, 255))
+    return image, surface_bytes(image)
+
+
 FONTS = tools.load_all_fonts(os.path.join("resources", "fonts"))
 MUSIC = tools.load_all_music(os.path.join("resources", "music"))
-SFX   = tools.load_all_sfx(os.path.join("resources", "sound"))
-GFX   = tools.load_all_gfx(os.path.join("resources", "graphics"))
+#Filled in by LOADER as each sound is decoded.
+SFX   = {}
+sound_paths = tools.find_files(os.path.join("resources", "sound"),
+            (".wav", ".mp3", ".ogg", ".mdi"))
+gfx_paths = tools.find_files(os.path.join("resources", "graphics"),
+            (".png", ".jpg", ".bmp"))
+GFX   = ASSETS.group("gfx", {name: partial(load_graphic, path)
+            for name, path in gfx_paths.items()})
 SCREEN.blit(GFX["crystal-frame"], (0, 0))
 pg.display.update()
 
-JEWELS = {}
 JEWEL_COLORS = ["blue", "pink", "clear"]
+#Number of distinct frames in each gem's spin. Gem 5 plays its 30 frames
+#twice to match the 60 frame spin of the others.
+JEWEL_FRAMES = {1: 60, 3: 60, 4: 60, 5: 30}
 p = os.path.join("resources", "jewels")
+jewel_sets = []
 for color in JEWEL_COLORS:
-    JEWELS[color] = {}
-    d_path = os.path.join(p, color)
-    for i in [1, 3, 4, 5]:
-        imgs  = tools.load_all_gfx(os.path.join(d_path, "gem{}".format(i)))
-        JEWELS[color][i] = [imgs["000{}".format(x)] for x in range(1, 10)]
-        limit = 61
-        if i == 5:
-            limit = 31
-        JEWELS[color][i].extend(
-                    [imgs["00{}".format(x)] for x in range(10, limit)])
-        if i == 5:
-            JEWELS[color][i].extend(JEWELS[color][i])
+    for i in sorted(JEWEL_FRAMES):
+        d_path = os.path.join(p, color, "gem{}".format(i))
+        jewel_sets.append(("{}/{}".format(color, i),
+                    [os.path.join(d_path, "{:04d}.png".format(x))
+                     for x in range(1, JEWEL_FRAMES[i] + 1)]))
+#(color, gem_num, frame) -> (sheet number, rect) for every spin frame,
+#filled in once the jewel atlas is packed.
+JEWEL_ATLAS = {}
+#(color, gem_num) -> the 60 frames of that jewel's spin, loaded on first
+#use once the jewel atlas is packed.
+JEWELS = ASSETS.group("jewels", {})
+
+
+def load_sound(name, path):
+    SFX[name] = CACHE.load_sound(path)
+
+
+def load_jewels(load_set, set_name, repeat):
+    frames, size = load_set(set_name)
+    return frames * repeat, size
+
+
+def pack_jewels():
+    atlas, load_set = tools.load_atlas(jewel_sets, CACHE, "jewels")
+    loaders = {}
+    for color in JEWEL_COLORS:
+        for i, num_frames in JEWEL_FRAMES.items():
+            set_name = "{}/{}".format(color, i)
+            frames = atlas[set_name] * (60 // num_frames)
+            for frame, (sheet, rect) in enumerate(frames):
+                JEWEL_ATLAS[(color, i, frame)] = sheet, rect
+            loaders[(color, i)] = partial(load_jewels, load_set, set_name,
+                        60 // num_frames)
+    ASSETS.group("jewels", loaders)
+
+#Graphics the title screen needs, loaded first so it can start while
+#everything else is still loading.
+TITLE_GRAPHICS = ["bg-big", "title", "title-cover", "button-continue",
+            "button-newgame"]
+#Loads everything else on a worker thread. States wait for the stage
+#named by their load_stage, or for all of it, before starting.
+LOADER = AssetLoader([
+            ("title", [partial(GFX.__getitem__, name)
+                        for name in TITLE_GRAPHICS]),
+            ("sounds", [partial(load_sound, name, path)
+                        for name, path in sorted(sound_paths.items())]),
+            ("graphics", [partial(CACHE.ensure_image, path, (255, 0, 255))
+                        for name, path in sorted(gfx_paths.items())
+                        if name not in TITLE_GRAPHICS]),
+            ("jewels", [pack_jewels]),
+            ("cache", [CACHE.save])])
+LOADER.start()
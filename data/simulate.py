@@ -0,0 +1,197 @@
+"""Monte Carlo balancing simulator.
+
+Plays automated games with rules.Game across a multiprocessing pool and
+reports score, level and time-to-game-over distributions for every
+combination of the parameters given, e.g.
+
+    python -m data.simulate --games 100000 --bonus-cooldown .01 .012
+
+Games stopped by --max-moves count as capped and are left out of the
+time-to-game-over figures.
+
+No pygame is imported, so this runs on a machine without a display."""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import random
+from array import array
+
+from .components.rules import (Game, make_level_targets, TARGET_BASE,
+            MAX_BONUS, BONUS_COOLDOWN, START_COMBOS, COMBO_INTERVAL)
+
+
+#Names of the swept parameters, in the order they are combined.
+PARAMETERS = ["target_base", "max_bonus", "bonus_cooldown",
+            "combo_interval", "start_combos"]
+
+
+def choose_random(game, moves):
+    return random.choice(moves)
+
+
+def choose_greedy(game, moves):
+    """Pick the swap that clears the most jewels before any cascade."""
+    swap_matches = game.board.swap_matches
+    best = max(sum(len(run) for run in swap_matches(*move))
+                for move in moves)
+    return random.choice([move for move in moves
+                if sum(len(run) for run in swap_matches(*move)) == best])
+
+
+POLICIES = {"random": choose_random, "greedy": choose_greedy}
+
+
+def play_game(params, policy, move_time, max_moves):
+    """Play one game and return (score, level, elapsed, capped)."""
+    target_base, max_bonus, bonus_cooldown, combo_interval, start_combos = params
+    game = Game(level_targets=make_level_targets(target_base),
+                max_bonus=max_bonus, bonus_cooldown=bonus_cooldown,
+                num_combos=start_combos, combo_interval=combo_interval)
+    while not game.done and game.moves_made < max_moves:
+        moves = game.legal_moves()
+        if moves:
+            game.swap(*policy(game, moves))
+        game.update(move_time)
+    return game.score, game.level, game.elapsed, not game.done
+
+
+def run_batch(task):
+    """Play a batch of games in a worker process. Results come back as
+    flat arrays, which pickle far smaller than a list of tuples. Times
+    are only kept for games that ended, since a capped game's time says
+    nothing about how long it would have lasted."""
+    key, params, games, seed, policy, move_time, max_moves = task
+    random.seed(seed)
+    choose = POLICIES[policy]
+    scores, levels, times = array("d"), array("d"), array("d")
+    capped = 0
+    for _ in range(games):
+        score, level, elapsed, was_capped = play_game(params, choose,
+                    move_time, max_moves)
+        scores.append(score)
+        levels.append(level)
+        if was_capped:
+            capped += 1
+        else:
+            times.append(elapsed)
+    return key, scores, levels, times, capped
+
+
+def make_tasks(param_sets, options):
+    """Split the games for each parameter set into chunks."""
+    seed = options.seed
+    for key, params in enumerate(param_sets):
+        remaining = options.games
+        while remaining > 0:
+            games = min(options.chunk, remaining)
+            remaining -= games
+            seed += 1
+            yield (key, params, games, seed, options.policy,
+                        options.move_time, options.max_moves)
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(values):
+    """Return the mean and 10th, 50th and 90th percentiles of values, or
+    None if there are none."""
+    if not values:
+        return None
+    values = sorted(values)
+    return {"mean": sum(values) / len(values),
+            "p10": percentile(values, .1),
+            "p50": percentile(values, .5),
+            "p90": percentile(values, .9)}
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--games", type=int, default=1000,
+                help="games to play per parameter set")
+    parser.add_argument("--processes", type=int,
+                default=multiprocessing.cpu_count())
+    parser.add_argument("--chunk", type=int, default=100,
+                help="games per task sent to a worker")
+    parser.add_argument("--target-base", type=int, nargs="+",
+                default=[TARGET_BASE], help="score needed to pass level 1")
+    parser.add_argument("--max-bonus", type=int, nargs="+",
+                default=[MAX_BONUS])
+    parser.add_argument("--bonus-cooldown", type=float, nargs="+",
+                default=[BONUS_COOLDOWN], help="bonus lost per millisecond")
+    parser.add_argument("--combo-interval", type=int, nargs="+",
+                default=[COMBO_INTERVAL], help="levels per extra combo")
+    parser.add_argument("--start-combos", type=int, nargs="+",
+                default=[START_COMBOS])
+    parser.add_argument("--move-time", type=float, default=3000,
+                help="milliseconds a player takes per move")
+    parser.add_argument("--max-moves", type=int, default=2000,
+                help="moves after which a game is stopped")
+    parser.add_argument("--policy", choices=sorted(POLICIES),
+                default="random")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the results as JSON here")
+    options = parser.parse_args(args)
+    for name in ("games", "processes", "chunk"):
+        if getattr(options, name) < 1:
+            parser.error("--{} must be at least 1".format(name))
+    if min(options.combo_interval) < 1:
+        parser.error("--combo-interval must be at least 1")
+    #Board.generate needs four combos to deal a board with no matches.
+    if min(options.start_combos) < 4:
+        parser.error("--start-combos must be at least 4")
+    return options
+
+
+def main(args=None):
+    options = parse_args(args)
+    param_sets = list(itertools.product(
+                *[getattr(options, name) for name in PARAMETERS]))
+    results = [[array("d"), array("d"), array("d"), 0] for _ in param_sets]
+    pool = multiprocessing.Pool(options.processes)
+    try:
+        for key, scores, levels, times, capped in pool.imap_unordered(
+                    run_batch, make_tasks(param_sets, options)):
+            result = results[key]
+            result[0].extend(scores)
+            result[1].extend(levels)
+            result[2].extend(times)
+            result[3] += capped
+    finally:
+        pool.close()
+        pool.join()
+
+    report = []
+    for params, (scores, levels, times, capped) in zip(param_sets, results):
+        report.append({"params": dict(zip(PARAMETERS, params)),
+                       "games": len(scores),
+                       "capped": (capped / float(len(scores))
+                                  if scores else None),
+                       "score": summarize(scores),
+                       "level": summarize(levels),
+                       "seconds": summarize([t / 1000. for t in times])})
+
+    row = "{:>8} {:>8} {:>8} {:>6} {:>6} {:>10} {:>10} {:>6} {:>6} {:>8} {:>8} {:>6}"
+    print(row.format("target", "bonus", "cooldown", "intvl", "combos",
+                "score p50", "score p90", "lvl50", "lvl90", "secs p50",
+                "secs p90", "capped"))
+    for entry in report:
+        p = entry["params"]
+        #Summaries of no games are None and print as "-".
+        stats = [entry[name] or {} for name in ("score", "level", "seconds")]
+        figures = [int(stat[k]) if k in stat else "-"
+                    for stat in stats for k in ("p50", "p90")]
+        capped = entry["capped"]
+        capped = "-" if capped is None else "{:.1%}".format(capped)
+        cells = [p[name] for name in PARAMETERS] + figures + [capped]
+        print(row.format(*cells))
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,15 +5,15 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.labels import Label, Blinker
-from ..components.animation import Animation, Task
-from ..components.ui import StainedGlass, ScreenBackground
+from ..components.animation import Animation, AnimationGroup, Task
+from ..components.ui import StainedGlass, gameplay_layers
 
 
 class BonusIcon(pg.sprite.Sprite):
     def __init__(self, center, color, gem_num, *groups):
         self.color = color
         self.gem_num = gem_num
-        self.base_image = prepare.JEWELS[color][gem_num][0]
+        self.base_image = prepare.JEWELS[color, gem_num][0]
         self.image = self.base_image.copy()
         self.rect = self.image.get_rect(center=center)
         self.width, self.height = self.rect.size
@@ -37,11 +37,10 @@ class BonusIcon(pg.sprite.Sprite):
 class BonusScreen(tools._State):
     def __init__(self):
         super(BonusScreen, self).__init__()
-        self.bg = ScreenBackground(prepare.GFX["bg-screen"],
-                    [(0, 0, 378, 150),(904, 4, 371, 544)])
 
     def startup(self, persistent):
-        self.animations = pg.sprite.Group()
+        self.layers = gameplay_layers()
+        self.animations = AnimationGroup()
         self.persist = persistent
         self.grid = self.persist["grid"]
         self.make_labels()
@@ -54,7 +53,7 @@ class BonusScreen(tools._State):
         self.timer = 0
         self.icons = []
         self.icon = None
-        self.bg.clear(pg.display.get_surface())
+        self.layers.clear(pg.display.get_surface())
 
     def make_labels(self):
         self.labels = pg.sprite.Group()
@@ -143,7 +142,7 @@ class BonusScreen(tools._State):
             self.quit_game()
 
     def draw(self, surface):
-        self.bg.draw(surface)
+        self.layers.draw_underlay(surface)
         self.grid.draw(surface)
         if self.cover is not None:
             surface.blit(self.cover, self.grid.rect)
@@ -151,5 +150,4 @@ class BonusScreen(tools._State):
             self.icon.draw(surface)
         self.label1.draw(surface)
         self.grid.ui.draw(surface)
-        surface.blit(prepare.GFX["crystal-frame"], (0, 0))
-        surface.blit(prepare.GFX["crystal-frame2"], (374, 0))
\ No newline at end of file
+        self.layers.draw_overlay(surface)
\ No newline at end of file
@@ -4,19 +4,18 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.labels import Label, Blinker
-from ..components.animation import Animation, Task
-from ..components.ui import ScreenBackground
+from ..components.animation import AnimationGroup
+from ..components.ui import gameplay_layers
 
 
 class ClearBonus(tools._State):
     def __init__(self):
         super(ClearBonus, self).__init__()
         self.remove_time = 250
-        self.bg = ScreenBackground(prepare.GFX["bg-screen"],
-                    [(0, 0, 378, 150),(904, 4, 371, 544)])
 
     def startup(self, persistent):
-        self.animations = pg.sprite.Group()
+        self.layers = gameplay_layers()
+        self.animations = AnimationGroup()
         self.persist = persistent
         self.grid = self.persist["grid"]
         self.grid.bonus = self.grid.max_bonus // 2
@@ -30,14 +29,14 @@ class ClearBonus(tools._State):
                 self.to_remove.append(cell)
         self.timer = 0
         self.jewel_count = 0
-        self.bg.clear(pg.display.get_surface())
+        self.layers.clear(pg.display.get_surface())
 
     def remove_jewel(self):
         try:
             cell = self.to_remove.pop()
         except IndexError:
             return
-        cell.jewel = None
+        self.grid.remove_jewel(cell)
         self.jewel_count += 1
         num = self.jewel_count
         if num > 21:
@@ -68,14 +67,12 @@ class ClearBonus(tools._State):
         else:
             self.grid.update(dt)
             if not self.grid.animations:
-                task = Task(self.to_gameplay, 1000)
-                self.animations.add(task)
+                self.animations.schedule(self.to_gameplay, 1000, unique=True)
         if self.grid.ui.quit:
             self.quit_game()
 
     def draw(self, surface):
-        self.bg.draw(surface)
+        self.layers.draw_underlay(surface)
         self.grid.draw(surface)
         self.grid.ui.draw(surface)
-        surface.blit(prepare.GFX["crystal-frame"], (0, 0))
-        surface.blit(prepare.GFX["crystal-frame2"], (374, 0))
\ No newline at end of file
+        self.layers.draw_overlay(surface)
\ No newline at end of file
@@ -6,7 +6,7 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.labels import Label, Button, ButtonGroup, Blinker
-from ..components.animation import Animation
+from ..components.animation import AnimationGroup
 from ..components.grid import BouncingBackground
 from ..components.ui import StainedGlass
 
@@ -20,7 +20,7 @@ class GameOver(tools._State):
                     prepare.GFX["bg-big"], 40)
 
     def startup(self, persistent):
-        self.animations = pg.sprite.Group()
+        self.animations = AnimationGroup()
         self.persist = persistent
 
         colors= [(0, 227, 255), (236, 230, 255),
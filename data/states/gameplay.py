@@ -4,21 +4,23 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.angles import get_distance
-from ..components.animation import Animation
+from ..components.animation import Animation, AnimationGroup, ANIMATION_POOL
 from ..components.labels import Label, Button, ButtonGroup
 from ..components.grid import TileGrid
-from ..components.ui import ScreenBackground
+from ..components.rules import decay_bonus
+from ..components.ui import gameplay_layers, settle
 
 
 class Gameplay(tools._State):
+    interpolates = True
+
     def __init__(self):
         super(Gameplay, self).__init__()
         self.color_scheme = 1
-        self.animations = pg.sprite.Group()
-        self.bg = ScreenBackground(prepare.GFX["bg-screen"],
-                    [(0, 0, 378, 150),(904, 4, 371, 544)])
+        self.animations = AnimationGroup()
 
     def startup(self, persistent):
+        self.layers = gameplay_layers()
         self.persist = persistent
         if self.persist["new game"]:
             self.grid = TileGrid((384, 9), 8, 8, (64, 64), self.color_scheme)
@@ -41,7 +43,8 @@ class Gameplay(tools._State):
         else:
             self.cover_alpha = 0
         self.persist["fade in"] = True
-        self.bg.clear(pg.display.get_surface())
+        self.layers.clear(pg.display.get_surface())
+        self.redraw = True
         self.pause_label = Label("Press Space To pause",
                     {"midtop": (self.grid.rect.centerx, self.grid.rect.bottom + 38)},
                     font_size=36, font_path=prepare.FONTS["vipond_octic"],
@@ -86,32 +89,34 @@ class Gameplay(tools._State):
                 if self.dest_tile is not None and self.dest_tile.jewel is None:
                     self.grid.reseat_jewel(self.grabbed)
                     return
-                valid = self.grid.check_move(self.grabbed, self.dest_tile)
-                if valid:
-                    self.swap_tiles(self.grabbed, self.dest_tile)
+                matches = self.grid.check_move(self.grabbed, self.dest_tile)
+                if matches:
+                    self.swap_tiles(self.grabbed, self.dest_tile, matches)
                 else:
                     self.grid.reseat_jewel(self.grabbed)
                     self.grid.reseat_jewel(self.dest_tile)
                 self.grabbed = None
         self.grid.ui.get_event(event)
 
-    def swap_tiles(self, grabbed_tile, tile2):
+    def swap_tiles(self, grabbed_tile, tile2, matches=None):
         gj = grabbed_tile.jewel
         dj = tile2.jewel
         speed = 3.5
         dist = get_distance(gj.rect.topleft, tile2.rect.topleft)
         if dist != 0:
             duration = int(speed * dist)
-            ani = Animation(left=tile2.rect.left, top=tile2.rect.top,
-                        duration=duration, round_values=True)
+            ani = ANIMATION_POOL.acquire(left=tile2.rect.left,
+                        top=tile2.rect.top, duration=duration,
+                        round_values=True)
             ani.start(gj.rect)
-            ani2 = Animation(left=grabbed_tile.rect.left, top=grabbed_tile.rect.top,
-                        duration=duration, round_values=True)
+            ani2 = ANIMATION_POOL.acquire(left=grabbed_tile.rect.left,
+                        top=grabbed_tile.rect.top, duration=duration,
+                        round_values=True)
             ani2.start(dj.rect)
             self.grid.animations.add(ani, ani2)
         tile2.jewel = gj
         grabbed_tile.jewel = dj
-        self.grid.recheck = True
+        self.grid.queue_matches(matches)
 
     def update(self, dt):
         self.last_click += dt
@@ -171,8 +176,10 @@ class Gameplay(tools._State):
             if current_dest is not None and current_dest != self.dest_tile:
                 if current_dest.jewel is not None:
                     current_dest.jewel.rect.topleft = current_dest.rect.topleft
+            self.grid.mark_dirty(self.grabbed, self.dest_tile, current_dest)
 
-        self.grid.bonus -= self.grid.bonus_cooldown * dt
+        self.grid.bonus = decay_bonus(self.grid.bonus,
+                    self.grid.bonus_cooldown, dt)
         if self.grid.bonus <= 0:
             self.grid.done = True
 
@@ -200,7 +207,29 @@ class Gameplay(tools._State):
             self.quit_game()
 
     def draw(self, surface):
-        self.bg.draw(surface)
+        """Draw the whole scene on the first frame, then redraw it clipped
+        to just the areas the grid and UI report as changed. The pause
+        label is settled on the first frame as it is never drawn over
+        again. Moving jewels and points labels are drawn alpha of a step
+        behind, between their last two positions, so frames drawn between
+        updates still move."""
+        self.grid.interpolate(self.alpha)
+        if self.redraw:
+            self.redraw = False
+            surface.blit(settle(self.pause_label.image), self.pause_label.rect)
+            self.draw_scene(surface)
+            rects = None
+        else:
+            rects = self.grid.dirty_rects() + self.grid.ui.dirty_rects()
+            for rect in rects:
+                surface.set_clip(rect)
+                self.draw_scene(surface)
+            surface.set_clip(None)
+        self.grid.restore()
+        return rects
+
+    def draw_scene(self, surface):
+        self.layers.draw_underlay(surface)
         self.pause_label.draw(surface)
         self.grid.draw(surface)
         if self.grabbed is not None and self.grabbed.jewel is not None:
@@ -208,5 +237,4 @@ class Gameplay(tools._State):
         if self.cover_alpha:
             surface.blit(self.cover, self.grid.rect.topleft)
         self.grid.ui.draw(surface)
-        surface.blit(prepare.GFX["crystal-frame"], (0, 0))
-        surface.blit(prepare.GFX["crystal-frame2"], (374, 0))
+        self.layers.draw_overlay(surface)
@@ -2,18 +2,17 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.labels import Label, Blinker
-from ..components.animation import Animation, Task
-from ..components.ui import StainedGlass, ScreenBackground
+from ..components.animation import Animation, AnimationGroup, Task
+from ..components.ui import StainedGlass, gameplay_layers
 
 
 class LevelUp(tools._State):
     def __init__(self):
         super(LevelUp, self).__init__()
-        self.bg = ScreenBackground(prepare.GFX["bg-screen"],
-                    [(0, 0, 378, 150),(904, 4, 371, 544)])
 
     def startup(self, persistent):
-        self.animations = pg.sprite.Group()
+        self.layers = gameplay_layers()
+        self.animations = AnimationGroup()
         self.persist = persistent
         self.grid = self.persist["grid"]
         if not self.grid.ui.volume_slider.muted:
@@ -93,12 +92,11 @@ class LevelUp(tools._State):
             self.quit_game()
 
     def draw(self, surface):
-        self.bg.draw(surface)
+        self.layers.draw_underlay(surface)
         self.grid.draw(surface)
         surface.blit(self.cover, self.grid.rect)
         for label in self.labels:
             label.draw(surface)
         self.grid.ui.draw(surface)
-        surface.blit(prepare.GFX["crystal-frame"], (0, 0))
-        surface.blit(prepare.GFX["crystal-frame2"], (374, 0))
+        self.layers.draw_overlay(surface)
 
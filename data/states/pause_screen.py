@@ -2,26 +2,26 @@ import pygame as pg
 
 from .. import tools, prepare
 from ..components.labels import Label
-from ..components.animation import Animation, Task
-from ..components.ui import StainedGlass, ScreenBackground
+from ..components.animation import Animation, AnimationGroup, Task
+from ..components.ui import StainedGlass, gameplay_layers
 
 
 class PauseScreen(tools._State):
     def __init__(self):
         super(PauseScreen, self).__init__()
-        self.bg = ScreenBackground(prepare.GFX["bg-screen"],
-                    [(0, 0, 378, 150),(904, 4, 371, 544)])
 
     def startup(self, persistent):
-        self.animations = pg.sprite.Group()
+        self.layers = gameplay_layers()
+        self.animations = AnimationGroup()
         self.persist = persistent
         self.grid = self.persist["grid"]
+        self.grid.prepare_board()
         self.make_labels()
         self.cover_alpha = 0
         self.leaving = False
         self.make_cover()
 
-        self.bg.clear(pg.display.get_surface())
+        self.layers.clear(pg.display.get_surface())
 
     def make_labels(self):
         self.labels = pg.sprite.Group()
@@ -88,11 +88,10 @@ class PauseScreen(tools._State):
             self.quit_game()
 
     def draw(self, surface):
-        self.bg.draw(surface)
+        self.layers.draw_underlay(surface)
         self.grid.draw(surface)
         surface.blit(self.cover, self.grid.rect)
         self.labels.draw(surface)
         self.grid.ui.draw(surface)
-        surface.blit(prepare.GFX["crystal-frame"], (0, 0))
-        surface.blit(prepare.GFX["crystal-frame2"], (374, 0))
+        self.layers.draw_overlay(surface)
 
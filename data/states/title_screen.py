@@ -5,16 +5,18 @@ import json
 import pygame as pg
 
 from .. import tools, prepare
-from ..components.animation import Animation
+from ..components.animation import Animation, AnimationGroup
 from ..components.labels import Label, Button, ButtonGroup
 from ..components.ui import BouncingBackground, StainedGlass
 
 
 class TitleScreen(tools._State):
+    load_stage = "title"
+
     def __init__(self):
         super(TitleScreen, self).__init__()
         self.labels = pg.sprite.Group()
-        self.animations = pg.sprite.Group()
+        self.animations = AnimationGroup()
         self.buttons = ButtonGroup()
         self.make_title()
         self.background = BouncingBackground((0, 0),
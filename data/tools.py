@@ -8,17 +8,44 @@ import copy
 
 import pygame as pg
 
+from .assets import file_stamp, surface_bytes
+
+
+def set_display_mode(size, flags=0, vsync=False):
+    """Set the display mode, synced to the monitor's refresh if vsync is
+    True and the platform allows it. pygame only supports that for
+    SCALED displays. Return the display surface and whether it is
+    synced."""
+    if vsync:
+        try:
+            return pg.display.set_mode(size, flags | pg.SCALED, vsync=1), True
+        except pg.error:
+            pass
+    return pg.display.set_mode(size, flags), False
+
 
 class Control(object):
     """Control class for entire project. Contains the game loop, and contains
     the event_loop which passes events to States as needed. Logic for flipping
-    states is also found here."""
-    def __init__(self, caption):
+    states is also found here.
+
+    States are updated in fixed steps of 1000 / sim_rate milliseconds,
+    however often frames are drawn. fps caps the frame rate, 0 leaves it
+    uncapped. Pass vsync=True if the display is synced to the monitor's
+    refresh, which then sets the pace instead of fps."""
+    def __init__(self, caption, vsync=False):
         self.screen = pg.display.get_surface()
         self.caption = caption
         self.done = False
         self.clock = pg.time.Clock()
-        self.fps = 60.
+        self.vsync = vsync
+        self.fps = 0 if vsync else 60.
+        self.sim_rate = 60.
+        #Steps run in one frame at most; time beyond that is dropped.
+        self.max_steps = 5
+        self.accumulator = 0.
+        self.alpha = 0.
+        self.waiting = False
         self.show_fps = False
         self.current_time = 0.0
         self.keys = pg.key.get_pressed()
@@ -26,6 +53,10 @@ class Control(object):
         self.state_name = None
         self.state = None
         self.fullscreen = False
+        self.dirty_rects = None
+        self.full_update = True
+        self.loader = None
+        self.splash = None
 
     def setup_states(self, state_dict, start_state):
         """Given a dictionary of States and a State to start in,
@@ -34,6 +65,31 @@ class Control(object):
         self.state_name = start_state
         self.state = self.state_dict[self.state_name]
 
+    def load(self, loader, splash, stage):
+        """Show splash until stage of loader, an AssetLoader, is ready.
+        splash.draw(surface, progress) draws it and returns rects as
+        _State.draw does. The splash is shown again whenever a state
+        is due to start before the assets it needs have loaded."""
+        self.loader = loader
+        self.splash = splash
+        while not self.done and not loader.ready(stage):
+            self.clock.tick(self.fps)
+            for event in pg.event.get():
+                if event.type == pg.QUIT:
+                    self.done = True
+            self.draw_splash()
+            self.update_display()
+
+    def loading(self, state_name):
+        """Return True if assets the named state needs are still loading."""
+        if self.loader is None:
+            return False
+        return not self.loader.ready(self.state_dict[state_name].load_stage)
+
+    def draw_splash(self):
+        self.loader.check()
+        self.dirty_rects = self.splash.draw(self.screen, self.loader.progress)
+
     def update(self, dt):
         """Checks if a state is done or has called for a game quit.
         State is flipped if neccessary and State.update is called."""
@@ -42,9 +98,50 @@ class Control(object):
             pg.mouse.set_visible(True)
             self.done = True
         elif self.state.done:
+            self.waiting = self.loading(self.state.next)
+            if self.waiting:
+                return
             self.flip_state()
         self.state.update(dt)
-        self.state.draw(self.screen)
+
+    def step(self, frame_time):
+        """Add frame_time to the time left over from earlier frames and
+        update the state in fixed steps for as much of it as possible.
+        Return the number of steps run. After max_steps the rest is
+        dropped, so after a stall the game slows down rather than
+        spending every later frame catching up."""
+        step = 1000. / self.sim_rate
+        self.accumulator += frame_time
+        steps = 0
+        while self.accumulator >= step and not self.done:
+            if steps == self.max_steps:
+                self.accumulator %= step
+                break
+            self.update(step)
+            self.accumulator -= step
+            steps += 1
+        self.alpha = self.accumulator / step
+        return steps
+
+    def draw(self):
+        """Draw the state, passing it the fraction of a step since its last
+        update as alpha, or the splash while its assets load."""
+        if self.waiting:
+            self.draw_splash()
+        else:
+            self.state.alpha = self.alpha
+            self.dirty_rects = self.state.draw(self.screen)
+
+    def update_display(self):
+        """Push the frame to the display. If the state's draw returned a
+        list of rects only those areas are updated; None (the default)
+        updates the whole screen, as does the first frame after a state
+        change or display mode change."""
+        if self.full_update or self.dirty_rects is None:
+            pg.display.update()
+            self.full_update = False
+        else:
+            pg.display.update(self.dirty_rects)
 
     def flip_state(self):
         """When a State changes to done necessary startup and cleanup functions
@@ -54,6 +151,7 @@ class Control(object):
         self.state = self.state_dict[self.state_name]
         self.state.startup(persist)
         self.state.previous = previous
+        self.full_update = True
 
     def event_loop(self):
         """Process all events and pass them down to current State.  The f5 key
@@ -82,19 +180,28 @@ class Control(object):
             self.fullscreen = not self.fullscreen
             img = self.screen.copy()
             if self.fullscreen:
-                self.screen = pg.display.set_mode(screen_size, pg.FULLSCREEN)
+                self.screen, synced = set_display_mode(screen_size,
+                            pg.FULLSCREEN, self.vsync)
                 
             else:
-                self.screen = pg.display.set_mode(screen_size, pg.NOFRAME)
+                self.screen, synced = set_display_mode(screen_size,
+                            pg.NOFRAME, self.vsync)
+            if self.vsync and not synced:
+                self.vsync = False
+                self.fps = 60.
             self.screen.blit(img, (0, 0))
+            self.full_update = True
 
     def main(self):
-        """Main loop for entire program."""
+        """Main loop for entire program. A frame is only drawn when the
+        state has been updated, unless it interpolates between steps."""
         while not self.done:
             time_delta = self.clock.tick(self.fps)
             self.event_loop()
-            self.update(time_delta)
-            pg.display.update()
+            steps = self.step(time_delta)
+            if steps or self.full_update or self.state.interpolates:
+                self.draw()
+                self.update_display()
             if self.show_fps:
                 fps = self.clock.get_fps()
                 with_fps = "{} - {:.2f} FPS".format(self.caption, fps)
@@ -106,6 +213,11 @@ class _State(object):
     No direct instances of this class should be created. get_event and update
     must be overloaded in the childclass.  startup and cleanup need to be
     overloaded when there is data that must persist between States."""
+    #The loading stage a state needs before it starts; None waits for all.
+    load_stage = None
+    #True if draw uses alpha, so frames between updates differ.
+    interpolates = False
+
     def __init__(self):
         self.start_time = 0.0
         self.current_time = 0.0
@@ -114,6 +226,8 @@ class _State(object):
         self.next = None
         self.previous = None
         self.persist = {}
+        #Fraction of an update step between the last update and drawing.
+        self.alpha = 0.
 
     def get_event(self, event):
         """Processes events that were passed from the main event loop.
@@ -137,6 +251,9 @@ class _State(object):
         pass
 
     def draw(self, surface):
+        """Draw the state to surface. Return a list of the rects that
+        changed to have only those updated on the display, or None to
+        update the whole screen."""
         pass
 
     def render_font(self, font, msg, color, center):
@@ -172,15 +289,21 @@ class _KwargMixin(object):
 
 
 ### Resource loading functions.
-def load_all_gfx(directory,colorkey=(255,0,255),accept=(".png",".jpg",".bmp")):
+def load_all_gfx(directory,colorkey=(255,0,255),accept=(".png",".jpg",".bmp"),
+            cache=None):
     """Load all graphics with extensions in the accept argument.  If alpha
     transparency is found in the image the image will be converted using
     convert_alpha().  If no alpha transparency is detected image will be
-    converted using convert() and colorkey will be set to colorkey."""
+    converted using convert() and colorkey will be set to colorkey. If an
+    AssetCache is passed, decoded images are taken from and added to it."""
     graphics = {}
     for pic in os.listdir(directory):
         name,ext = os.path.splitext(pic)
         if ext.lower() in accept:
+            if cache is not None:
+                path = os.path.join(directory, pic)
+                graphics[name] = cache.load_image(path, colorkey)
+                continue
             img = pg.image.load(os.path.join(directory, pic))
             if img.get_alpha():
                 img = img.convert_alpha()
@@ -191,41 +314,132 @@ def load_all_gfx(directory,colorkey=(255,0,255),accept=(".png",".jpg",".bmp")):
     return graphics
 
 
+def find_files(directory, accept):
+    """Create a dictionary of paths to the files in given directory whose
+    extensions are in accept, keyed by file name without extension."""
+    paths = {}
+    for filename in os.listdir(directory):
+        name,ext = os.path.splitext(filename)
+        if ext.lower() in accept:
+            paths[name] = os.path.join(directory, filename)
+    return paths
+
+
 def load_all_music(directory, accept=(".wav", ".mp3", ".ogg", ".mdi")):
     """Create a dictionary of paths to music files in given directory
     if their extensions are in accept."""
-    songs = {}
-    for song in os.listdir(directory):
-        name,ext = os.path.splitext(song)
-        if ext.lower() in accept:
-            songs[name] = os.path.join(directory, song)
-    return songs
+    return find_files(directory, accept)
 
 
 def load_all_fonts(directory, accept=(".ttf", ".otf")):
     """Create a dictionary of paths to font files in given directory
     if their extensions are in accept."""
-    return load_all_music(directory, accept)
+    return find_files(directory, accept)
 
 
 def load_all_movies(directory, accept=(".mpg",)):
     """Create a dictionary of paths to movie files in given directory
     if their extensions are in accept."""
-    return load_all_music(directory, accept)
+    return find_files(directory, accept)
 
 
-def load_all_sfx(directory, accept=(".wav", ".mp3", ".ogg", ".mdi")):
+def load_all_sfx(directory, accept=(".wav", ".mp3", ".ogg", ".mdi"),
+            cache=None):
     """Load all sfx of extensions found in accept.  Unfortunately it is
     common to need to set sfx volume on a one-by-one basis.  This must be done
-    manually if necessary in the setup module."""
+    manually if necessary in the setup module. If an AssetCache is passed,
+    decoded samples are taken from and added to it."""
     effects = {}
     for fx in os.listdir(directory):
         name,ext = os.path.splitext(fx)
         if ext.lower() in accept:
-            effects[name] = pg.mixer.Sound(os.path.join(directory, fx))
+            path = os.path.join(directory, fx)
+            if cache is not None:
+                effects[name] = cache.load_sound(path)
+            else:
+                effects[name] = pg.mixer.Sound(path)
     return effects
 
 
+def pack_atlas(frame_sets, columns, max_height):
+    """Lay out named lists of equally sized frames on sheets columns frames
+    wide. Each set starts on a new row and is kept on one sheet, and a new
+    sheet is started rather than let one grow past max_height. Returns the
+    sheet sizes and a dict of set name to a list of (sheet, rect) lists."""
+    sizes = []
+    index = {}
+    top = max_height
+    for name, size, count in frame_sets:
+        w, h = size
+        rows = -(-count // columns)
+        if top + rows * h > max_height:
+            sizes.append([columns * w, 0])
+            top = 0
+        sheet = len(sizes) - 1
+        index[name] = [(sheet, [(i % columns) * w, top + (i // columns) * h,
+                                w, h]) for i in range(count)]
+        top += rows * h
+        sizes[sheet][1] = top
+    return sizes, index
+
+
+def load_atlas(frame_sets, cache, name, columns=16, max_height=1024):
+    """Pack frames onto a few large sheets kept in cache, an AssetCache,
+    under name. frame_sets is a list of (set name, list of image paths).
+
+    Returns (index, load_set). index maps each set name to a list of
+    (sheet number, pygame.Rect) for its frames. load_set(set_name) returns
+    (frames, bytes) where frames are subsurfaces of a surface built from
+    just the rows of the sheet the set occupies, so sets can be loaded
+    one at a time. The sheets are built from the individual images the
+    first time and rebuilt whenever a source image changes."""
+    paths = dict(frame_sets)
+    stamp = [[set_name, [file_stamp(path) for path in set_paths]]
+                for set_name, set_paths in frame_sets]
+    key = "{}/{}".format
+    entry = cache.lookup(key(name, 0), stamp)
+    if entry is not None:
+        meta = entry["meta"]
+        for n in range(1, meta["sheets"]):
+            cache.lookup(key(name, n), stamp)
+    else:
+        frames = {set_name: [pg.image.load(path) for path in set_paths]
+                    for set_name, set_paths in frame_sets}
+        sizes, index = pack_atlas([(set_name, frames[set_name][0].get_size(),
+                    len(set_paths)) for set_name, set_paths in frame_sets],
+                    columns, max_height)
+        sheets = []
+        for size in sizes:
+            sheet = pg.Surface(size, pg.SRCALPHA)
+            sheet.fill((0, 0, 0, 0))
+            sheets.append(sheet)
+        for set_name, set_paths in frame_sets:
+            for image, (n, rect) in zip(frames[set_name], index[set_name]):
+                sheets[n].blit(image, rect, special_flags=pg.BLEND_RGBA_MAX)
+        meta = {"sheets": len(sheets), "index": index}
+        for n, sheet in enumerate(sheets):
+            cache.put_surface(key(name, n), stamp, sheet.convert_alpha(),
+                        meta if n == 0 else None)
+    index = {set_name: [(n, pg.Rect(rect)) for n, rect in frames]
+                for set_name, frames in meta["index"].items()}
+
+    def load_set(set_name):
+        frames = index[set_name]
+        top = min(rect.top for n, rect in frames)
+        height = max(rect.bottom for n, rect in frames) - top
+        cached = cache.get_surface(key(name, frames[0][0]), stamp,
+                    (top, height))
+        if cached is None:
+            images = [pg.image.load(path).convert_alpha()
+                        for path in paths[set_name]]
+            return images, sum(surface_bytes(image) for image in images)
+        band = cached[0]
+        return ([band.subsurface(rect.move(0, -top)) for n, rect in frames],
+                surface_bytes(band))
+
+    return index, load_set
+
+
 def strip_from_sheet(sheet, start, size, columns, rows=1):
     """Strips individual frames from a sprite sheet given a start location,
     sprite size, and number of columns and rows."""